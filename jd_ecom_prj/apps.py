@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
+
+MINIFIED_SUFFIXES = ('.min.css', '.min.js')
+
+
+def unminified_duplicates(directories):
+    """Relative paths of foo.css/foo.js files that sit next to a foo.min.*"""
+    duplicates = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if not filename.endswith(MINIFIED_SUFFIXES):
+                    continue
+                stem, _, extension = filename.rpartition('.min.')
+                original = f'{stem}.{extension}'
+                if original in files:
+                    path = os.path.join(root, original)
+                    duplicates.append(
+                        os.path.relpath(path, directory).replace(os.sep, '/'))
+    return duplicates
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    """
+    Keep SCSS sources and unminified copies out of collectstatic, so only
+    files the pages can actually load get hashed and compressed.
+    """
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + ['scss', '*.scss']
+
+    def ready(self):
+        super().ready()
+        self.ignore_patterns = self.ignore_patterns + unminified_duplicates(
+            settings.STATICFILES_DIRS)
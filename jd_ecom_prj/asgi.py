@@ -3,13 +3,23 @@ ASGI config for jd_ecom_prj project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it under uvicorn workers with:
+
+    gunicorn jd_ecom_prj.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+# Django 3.0 runs every view through sync_to_async, on asgiref's default
+# thread pool. Bound it so a burst of requests can't open more database
+# connections than the server allows; this has to be set before asgiref
+# is imported.
+os.environ.setdefault('ASGI_THREADS', '10')
+
+from django.core.asgi import get_asgi_application  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jd_ecom_prj.settings')
 
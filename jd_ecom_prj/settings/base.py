@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 import os
+import tempfile
 from decouple import config
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -36,7 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'jd_ecom_prj.apps.StaticFilesConfig',
     'django.contrib.sites',
 
     'allauth',
@@ -49,10 +50,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.middleware.GuestCartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -75,8 +78,46 @@ TEMPLATES = [
     },
 ]
 
+# Parse every project template when the store app loads (see store/apps.py)
+PRECOMPILE_TEMPLATES = False
+
 WSGI_APPLICATION = 'jd_ecom_prj.wsgi.application'
 
+# Cache
+# File based so every gunicorn worker (and manage.py) shares one cache
+# without needing an outside service
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'jd_ecom_prj_cache')),
+        # Room for a card fragment per item before culling kicks in
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Seconds an anonymous catalog page stays cached; Item changes clear it sooner
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Query budgets (see store/middleware.py)
+# Maximum queries per request, by URL name; QUERY_BUDGET_ACTION is 'warn'
+# to log a warning or 'raise' to fail the request, e.g. in tests
+
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=False, cast=bool)
+QUERY_BUDGET_SERVER_TIMING = config(
+    'QUERY_BUDGET_SERVER_TIMING', default=False, cast=bool)
+QUERY_BUDGET_ACTION = config('QUERY_BUDGET_ACTION', default='warn')
+QUERY_BUDGETS = {
+    'home-page': 8,
+    'search-page': 8,
+    'product-page': 6,
+    'order-summary-page': 10,
+    'checkout-page': 12,
+    'payment-page': 10,
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -103,6 +144,10 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
+# Use keyset (?cursor=) pagination on the catalog instead of ?page=
+CATALOG_CURSOR_PAGINATION = config(
+    'CATALOG_CURSOR_PAGINATION', default=False, cast=bool)
+
 # LOGIN_REDIRECT_URL = 'blog-home'
 # LOGIN_URL = 'login'
 
@@ -116,3 +161,22 @@ AUTHENTICATION_BACKENDS = [
 SITE_ID = 1
 
 LOGIN_REDIRECT_URL = 'home-page'
+
+# Point at a local stripe-mock (e.g. http://localhost:12111) for testing
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='https://api.stripe.com')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'store': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
@@ -17,6 +17,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # On disk rather than in memory so threaded tests get real locking
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
@@ -38,9 +40,16 @@ DEBUG_TOOLBAR_PANELS = [
     'debug_toolbar.panels.profiling.ProfilingPanel',
 ]
 
+def show_toolbar(request):
+    # Read at request time so the test runner (which turns DEBUG off)
+    # doesn't render a toolbar whose URLs aren't installed
+    from django.conf import settings
+    return settings.DEBUG
+
+
 DEBUG_TOOLBAR_CONFIG = {
     'INTERCEPT_REDIRECTS': False,
-    'SHOW_TOOLBAR_CALLBACK': lambda request: True
+    'SHOW_TOOLBAR_CALLBACK': show_toolbar
 }
 
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY')
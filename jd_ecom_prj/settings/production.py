@@ -4,6 +4,29 @@ DEBUG = False
 
 ALLOWED_HOSTS = ['127.0.0.1']
 
+# Keep compiled templates for the life of the worker, and compile them all
+# as the worker boots
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+PRECOMPILE_TEMPLATES = True
+
+# Static files
+# WhiteNoise serves the collected files with hashed names and far-future
+# cache headers; collectstatic writes .gz (and .br, with Brotli installed)
+# copies next to each file
+
+MIDDLEWARE = MIDDLEWARE[:1] + [
+    'whitenoise.middleware.WhiteNoiseMiddleware'
+] + MIDDLEWARE[1:]
+
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -23,8 +23,7 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')),
     # path('store/', include('store.urls')),
     path('', include('store.urls'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) + static(
-    settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG:
     import debug_toolbar
@@ -1,19 +1,32 @@
 from django.contrib import admin
 
+from .exports import orders_csv_response
 from .models import Address, Item, OrderItem, Order, Payment, Coupon, Refund
+from .pagination import EstimatedCountPaginator
+from .refunds import queue_refunds
 
 
-def make_refund_accepted(modeladmin, request, queryset):
-    queryset.update(refund_requested=False, refund_granted=True)
+def grant_refunds(modeladmin, request, queryset):
+    queued = queue_refunds(queryset)
+    modeladmin.message_user(
+        request, f'{queued} refunds queued; they are issued by manage.py process_refunds')
 
 
-make_refund_accepted.short_description = 'Update refund requests'
+grant_refunds.short_description = 'Grant refunds'
+
+
+def export_orders_csv(modeladmin, request, queryset):
+    return orders_csv_response(queryset)
+
+
+export_orders_csv.short_description = 'Export selected orders as CSV'
 
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
         'user',
         'ordered',
+        'order_total',
         'coupon',
         'payment',
         'billing_address',
@@ -32,6 +45,18 @@ class OrderAdmin(admin.ModelAdmin):
         'coupon'
     ]
 
+    # Address and Payment print their user's name
+    list_select_related = [
+        'user',
+        'coupon',
+        'payment__user',
+        'billing_address__user',
+        'shipping_address__user'
+    ]
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     list_filter = [
         'ordered',
         'shipped',
@@ -41,15 +66,34 @@ class OrderAdmin(admin.ModelAdmin):
     ]
 
     search_fields = [
-        'user__username',
-        'ref_code'
+        '=user__username',
+        '=ref_code'
     ]
 
-    actions = [make_refund_accepted]
+    actions = [grant_refunds, export_orders_csv]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    def order_total(self, obj):
+        return obj.total
+    order_total.admin_order_field = 'total'
+    order_total.short_description = 'Total'
+
+
+class ItemAdmin(admin.ModelAdmin):
+    list_display = ['title', 'price', 'discount_price', 'category', 'label']
+    list_filter = ['category', 'label']
+    search_fields = ['=slug']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['item', 'quantity', 'ordered']
+    list_select_related = ['item']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class AddressAdmin(admin.ModelAdmin):
@@ -65,19 +109,34 @@ class AddressAdmin(admin.ModelAdmin):
 
     list_filter = ['default', 'address_type', 'country']
 
-    search_fields = [
-        'user',
-        'street_address',
-        'apartment_address',
-        'zip_code'
-    ]
+    list_select_related = ['user']
+
+    # Substring matches on the address columns would scan the whole table
+    search_fields = ['=user__username']
+
+
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ['user', 'amount', 'status', 'stripe_charge_id', 'timestamp']
+    list_filter = ['status']
+    list_select_related = ['user']
+    search_fields = ['=stripe_charge_id', '=user__username']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RefundAdmin(admin.ModelAdmin):
+    list_display = ['order', 'accepted', 'status', 'amount', 'stripe_refund_id', 'email']
+    list_filter = ['accepted', 'status']
+    list_select_related = ['order__user']
+    readonly_fields = ['status', 'amount', 'idempotency_key', 'stripe_refund_id',
+                       'error_message', 'claimed_at']
 
 
 # Register your models here.
-admin.site.register(Item)
+admin.site.register(Item, ItemAdmin)
 admin.site.register(OrderItem, OrderItemAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(Address, AddressAdmin)
-admin.site.register(Payment)
+admin.site.register(Payment, PaymentAdmin)
 admin.site.register(Coupon)
-admin.site.register(Refund)
+admin.site.register(Refund, RefundAdmin)
@@ -1,5 +1,21 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class StoreConfig(AppConfig):
     name = 'store'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if settings.PRECOMPILE_TEMPLATES:
+            # Pay the template parse cost at worker start, not on the
+            # first request the worker serves
+            from .warmup import precompile_templates
+            compiled, failed, seconds = precompile_templates()
+            logger.info('Precompiled %d templates (%d failed) in %.0f ms',
+                        compiled, failed, seconds * 1000)
@@ -0,0 +1,137 @@
+"""
+Whole-page caching for the anonymous catalog.
+
+Cached pages are keyed on a catalog version number that the Item signals
+bump, so any change to the catalog invalidates every cached page at once
+without having to track which pages showed which items.
+
+Hits and misses are counted in each process and written to the cache at
+most once every STATS_FLUSH_INTERVAL seconds. A write costs far more than
+a cache hit on the file backend, so writing on every request would slow
+down the pages the cache is meant to speed up.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+STATS_KEY = 'catalog:stats'
+STATS_FLUSH_INTERVAL = 60
+
+# This process's running totals since it started
+_counts = Counter()
+_counts_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+        return 1
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    _incr(VERSION_KEY)
+
+
+def _record(outcome):
+    global _last_flush
+    with _counts_lock:
+        _counts[outcome] += 1
+        now = time.monotonic()
+        due = now - _last_flush >= STATS_FLUSH_INTERVAL
+        if due:
+            _last_flush = now
+    if due:
+        flush_cache_stats()
+
+
+def flush_cache_stats():
+    """
+    Publish this process's totals under its pid. Each process only
+    writes its own entry, and always the full running total, so if two
+    processes flush at once, the lost write is repaired at the next flush.
+    """
+    with _counts_lock:
+        hits, misses = _counts['hits'], _counts['misses']
+    if not hits and not misses:
+        return
+    stats = cache.get(STATS_KEY) or {}
+    stats[os.getpid()] = (hits, misses)
+    cache.set(STATS_KEY, stats, timeout=None)
+    logger.info('catalog cache (pid %d): %d hits, %d misses',
+                os.getpid(), hits, misses)
+
+
+def catalog_cache_stats():
+    """Totals flushed by every process, plus this one's unflushed counts."""
+    flush_cache_stats()
+    stats = (cache.get(STATS_KEY) or {}).values()
+    return {
+        'version': catalog_version(),
+        'hits': sum(hits for hits, _ in stats),
+        'misses': sum(misses for _, misses in stats),
+    }
+
+
+class AnonymousCacheMixin:
+    """
+    Serve rendered pages from the cache for anonymous visitors.
+
+    Logged in users and guests with a cart (whose navbar shows it), and
+    anyone with flash messages waiting, are always rendered fresh.
+    """
+    cache_prefix = 'page'
+
+    def is_cacheable(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and not getattr(request, 'guest_cart', None)
+            and not len(get_messages(request))
+        )
+
+    def get_cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'catalog:{catalog_version()}:{self.cache_prefix}:{path}'
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        response = cache.get(key)
+        if response is not None:
+            _record('hits')
+            return response
+
+        _record('misses')
+        response = super().dispatch(request, *args, **kwargs)
+        # Responses that set cookies (e.g. a fresh CSRF token) are per visitor
+        if response.status_code == 200 and not response.cookies:
+            timeout = settings.CATALOG_CACHE_TIMEOUT
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.add_post_render_callback(
+                    lambda r: cache.set(key, r, timeout))
+            else:
+                cache.set(key, response, timeout)
+        return response
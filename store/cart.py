@@ -0,0 +1,227 @@
+"""
+Cart mutations.
+
+For logged in users each function runs in one transaction with the
+user's open order locked (select_for_update), and quantities change
+through F() expressions, so double clicks and parallel tabs can't lose
+updates. A click on a line already in the cart costs a lock and an UPDATE.
+SQLite ignores select_for_update, so there the lock is taken with a no-op
+UPDATE instead; see _lock_open_order(). While the order has a payment
+waiting to be charged its lines are frozen, so the charge matches the cart.
+
+Logged out visitors get a GuestCart kept in a signed cookie, which costs
+no database writes at all; merge_items() folds it into their open order
+when they log in.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Item, Order, OrderItem
+from .payments import PENDING, PROCESSING
+
+ADDED = 'added'
+UPDATED = 'updated'
+REMOVED = 'removed'
+NOT_IN_CART = 'not-in-cart'
+NO_ORDER = 'no-order'
+CART_FULL = 'cart-full'
+PAYMENT_PENDING = 'payment-pending'
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'store.cart'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+# Keeps the cookie well under the 4KB browsers allow
+MAX_GUEST_LINES = 50
+
+
+def _lock_open_order(user, create=False):
+    if connection.vendor == 'sqlite':
+        # A transaction that reads before it writes can't wait for another
+        # writer and fails with "database is locked". Writing first takes
+        # the database's write lock up front, waiting out the busy timeout.
+        Order.objects.filter(user=user, ordered=False).update(
+            item_count=F('item_count'))
+    orders = Order.objects.select_related('payment').select_for_update(
+        of=('self',))
+    if create:
+        order, _ = orders.get_or_create(
+            user=user,
+            ordered=False,
+            defaults={'ordered_date': timezone.now()})
+        return order
+    return orders.filter(user=user, ordered=False).first()
+
+
+def payment_pending(order):
+    """Whether the order has a payment queued or being charged."""
+    return order.payment is not None and order.payment.status in (
+        PENDING, PROCESSING)
+
+
+def _remove_lines(order, item):
+    line_ids = list(order.items.filter(item=item).values_list('pk', flat=True))
+    if not line_ids:
+        return NOT_IN_CART
+    OrderItem.objects.filter(pk__in=line_ids).delete()
+    Order.objects.filter(pk=order.pk).update(
+        item_count=F('item_count') - len(line_ids))
+    return REMOVED
+
+
+def add_item(user, item):
+    with transaction.atomic():
+        order = _lock_open_order(user, create=True)
+        if payment_pending(order):
+            return PAYMENT_PENDING
+        if order.items.filter(item=item).update(quantity=F('quantity') + 1):
+            return UPDATED
+        order_item = OrderItem.objects.create(user=user, item=item)
+        order.items.add(order_item)
+        Order.objects.filter(pk=order.pk).update(
+            item_count=F('item_count') + 1)
+        return ADDED
+
+
+def decrement_item(user, item):
+    """Take one off the line's quantity, dropping the line at zero."""
+    with transaction.atomic():
+        order = _lock_open_order(user)
+        if order is None:
+            return NO_ORDER
+        if payment_pending(order):
+            return PAYMENT_PENDING
+        if order.items.filter(item=item, quantity__gt=1).update(
+                quantity=F('quantity') - 1):
+            return UPDATED
+        return _remove_lines(order, item)
+
+
+def remove_item(user, item):
+    with transaction.atomic():
+        order = _lock_open_order(user)
+        if order is None:
+            return NO_ORDER
+        if payment_pending(order):
+            return PAYMENT_PENDING
+        return _remove_lines(order, item)
+
+
+def apply_coupon(user, coupon):
+    with transaction.atomic():
+        order = _lock_open_order(user)
+        if order is None:
+            return NO_ORDER
+        if payment_pending(order):
+            return PAYMENT_PENDING
+        Order.objects.filter(pk=order.pk).update(coupon=coupon)
+        return UPDATED
+
+
+def merge_items(user, lines):
+    """
+    Add a guest cart's {item pk: quantity} to the user's open order, in
+    one transaction with a fixed number of queries. Returns None, leaving
+    the order alone, while the order has a payment pending.
+    """
+    with transaction.atomic():
+        order = _lock_open_order(user, create=True)
+        if payment_pending(order):
+            return None
+        lines = {pk: lines[pk] for pk in Item.objects.filter(
+            pk__in=list(lines)).values_list('pk', flat=True)}
+        if not lines:
+            return 0
+
+        existing = list(order.items.filter(item_id__in=list(lines)))
+        for line in existing:
+            line.quantity += lines.pop(line.item_id, 0)
+        OrderItem.objects.bulk_update(existing, ['quantity'])
+
+        # bulk_create doesn't return pks on every backend, so the new lines
+        # are found afterwards by leaving out the user's open lines that
+        # existed before, including ones orphaned outside any order
+        open_lines = OrderItem.objects.filter(
+            user=user, ordered=False, item_id__in=list(lines))
+        old_line_ids = list(open_lines.values_list('pk', flat=True))
+        OrderItem.objects.bulk_create(
+            OrderItem(user=user, item_id=pk, quantity=quantity)
+            for pk, quantity in lines.items())
+        new_line_ids = open_lines.exclude(
+            pk__in=old_line_ids).values_list('pk', flat=True)
+        Order.items.through.objects.bulk_create(
+            Order.items.through(order_id=order.pk, orderitem_id=pk)
+            for pk in new_line_ids)
+        Order.objects.filter(pk=order.pk).update(
+            item_count=F('item_count') + len(lines))
+        return len(existing) + len(lines)
+
+
+class GuestCart:
+    """
+    A logged out visitor's cart, item pk -> quantity, stored in a signed
+    cookie as "12:1,40:2". GuestCartMiddleware loads it onto
+    request.guest_cart and writes it back when it changes.
+    """
+
+    def __init__(self, lines=None):
+        self.lines = dict(lines or {})
+        self.modified = False
+
+    @classmethod
+    def from_request(cls, request):
+        value = request.get_signed_cookie(
+            COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        lines = {}
+        try:
+            for pair in value.split(',') if value else []:
+                pk, quantity = pair.split(':')
+                if int(quantity) > 0:
+                    lines[int(pk)] = int(quantity)
+        except ValueError:
+            lines = {}
+        return cls(lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add(self, item):
+        if item.pk in self.lines:
+            self.lines[item.pk] += 1
+            result = UPDATED
+        elif len(self.lines) >= MAX_GUEST_LINES:
+            return CART_FULL
+        else:
+            self.lines[item.pk] = 1
+            result = ADDED
+        self.modified = True
+        return result
+
+    def decrement(self, item):
+        if self.lines.get(item.pk, 0) > 1:
+            self.lines[item.pk] -= 1
+            self.modified = True
+            return UPDATED
+        return self.remove(item)
+
+    def remove(self, item):
+        if self.lines.pop(item.pk, None) is None:
+            return NOT_IN_CART
+        self.modified = True
+        return REMOVED
+
+    def clear(self):
+        if self.lines:
+            self.lines = {}
+            self.modified = True
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if self.lines:
+            value = ','.join(f'{pk}:{quantity}' for pk, quantity in self.lines.items())
+            response.set_signed_cookie(
+                COOKIE_NAME, value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE,
+                httponly=True, samesite='Lax')
+        else:
+            response.delete_cookie(COOKIE_NAME)
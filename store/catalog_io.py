@@ -0,0 +1,121 @@
+"""
+Reading and writing the catalog as CSV or JSON Lines.
+
+Both formats carry the columns in FIELDS, one item per row, and are read
+and written a row at a time so files of any size stream through in
+bounded memory. See the import_items and export_items commands.
+"""
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+
+from .images import generate_derivatives
+from .models import CATEGORY_CHOICES, LABEL_CHOICES, Item
+from .pricing import CENT
+
+FIELDS = (
+    'slug', 'title', 'price', 'discount_price', 'category', 'label',
+    'description', 'image',
+)
+FORMATS = ('csv', 'jsonl')
+
+CATEGORIES = {value for value, _ in CATEGORY_CHOICES}
+LABELS = {value for value, _ in LABEL_CHOICES}
+MAX_PRICE = Decimal('99999999.99')
+SLUG_LENGTH = Item._meta.get_field('slug').max_length
+TITLE_LENGTH = Item._meta.get_field('title').max_length
+
+
+def guess_format(path):
+    return 'jsonl' if os.path.splitext(path)[1] in ('.jsonl', '.ndjson') else 'csv'
+
+
+def read_rows(f, file_format):
+    """Yield (line number, row) for each row of an open text file."""
+    if file_format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                # Let clean_row report it along with the other bad rows
+                yield line_number, line
+
+
+def _price(row, field, required=False):
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    try:
+        price = Decimal(str(value).strip()).quantize(CENT)
+    except InvalidOperation:
+        raise ValueError(f'{field} is not a number: {value!r}')
+    if not 0 <= price <= MAX_PRICE:
+        raise ValueError(f'{field} is out of range: {value!r}')
+    return price
+
+
+def clean_row(row):
+    """Validate one row and return it as Item field values."""
+    if not isinstance(row, dict):
+        raise ValueError('not a JSON object')
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise ValueError('title is required')
+    if len(title) > TITLE_LENGTH:
+        raise ValueError(f'title is longer than {TITLE_LENGTH} characters')
+    category = str(row.get('category') or '').strip()
+    if category not in CATEGORIES:
+        raise ValueError(f'unknown category {category!r}')
+    label = str(row.get('label') or '').strip()
+    if label not in LABELS:
+        raise ValueError(f'unknown label {label!r}')
+    slug = slugify(row.get('slug') or title)[:SLUG_LENGTH]
+    if not slug:
+        raise ValueError('could not make a slug')
+    return {
+        'slug': slug,
+        'title': title,
+        'price': _price(row, 'price', required=True),
+        'discount_price': _price(row, 'discount_price'),
+        'category': category,
+        'label': label,
+        'description': str(row.get('description') or ''),
+        'image': str(row.get('image') or '').strip(),
+    }
+
+
+def write_rows(f, file_format, rows):
+    """Write tuples of FIELDS values to an open text file."""
+    if file_format == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow('' if value is None else value for value in row)
+    else:
+        for row in rows:
+            f.write(json.dumps(dict(zip(FIELDS, row)), default=str))
+            f.write('\n')
+
+
+def ingest_image(source_dir, name):
+    """
+    Copy an image from source_dir into media storage unless it's already
+    there, then make its derivatives. Runs in a process pool.
+    """
+    if not default_storage.exists(name):
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            default_storage.save(name, File(f))
+    return generate_derivatives(name)
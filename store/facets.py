@@ -0,0 +1,147 @@
+"""
+Faceted browsing for the catalog.
+
+The sidebar counts are read from the FacetCount summary table rather than
+GROUP BYs over Item. The Item signals adjust the affected rows on every
+save and delete; rebuild_facets() recomputes the table from scratch after
+bulk loads that skip signals.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+
+from .models import CATEGORY_CHOICES, LABEL_CHOICES, FacetCount, Item
+
+# (value, title, low, high) on the price a shopper pays
+PRICE_BANDS = (
+    ('0-25', 'Under $25', Decimal('0'), Decimal('25')),
+    ('25-50', '$25 to $50', Decimal('25'), Decimal('50')),
+    ('50-100', '$50 to $100', Decimal('50'), Decimal('100')),
+    ('100+', '$100 and up', Decimal('100'), None),
+)
+
+DISCOUNT_CHOICES = (
+    ('yes', 'On sale'),
+    ('no', 'Full price'),
+)
+
+FACETS = (
+    ('category', 'Category', CATEGORY_CHOICES),
+    ('label', 'Label', LABEL_CHOICES),
+    ('price', 'Price', [(value, title) for value, title, _, _ in PRICE_BANDS]),
+    ('discount', 'Discount', DISCOUNT_CHOICES),
+)
+
+
+def price_band(price):
+    for value, _, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return value
+    return None
+
+
+def facet_values(item):
+    """The (facet, value) pairs a single item counts towards."""
+    on_sale = item.discount_price is not None
+    effective_price = item.discount_price if on_sale else item.price
+    return [
+        ('category', item.category),
+        ('label', item.label),
+        ('price', price_band(Decimal(effective_price))),
+        ('discount', 'yes' if on_sale else 'no'),
+    ]
+
+
+def compute_facet_counts(items):
+    """Count facet values over an Item queryset with a handful of GROUP BYs."""
+    counts = Counter()
+    for facet in ('category', 'label'):
+        for row in items.values(facet).annotate(n=Count('pk')).order_by():
+            counts[(facet, row[facet])] = row['n']
+
+    items = items.annotate(
+        effective_price=Coalesce('discount_price', 'price'))
+    aggregates = {
+        'discount:yes': Count('pk', filter=Q(discount_price__isnull=False)),
+        'discount:no': Count('pk', filter=Q(discount_price__isnull=True)),
+    }
+    for value, _, low, high in PRICE_BANDS:
+        band = Q(effective_price__gte=low)
+        if high is not None:
+            band &= Q(effective_price__lt=high)
+        aggregates[f'price:{value}'] = Count('pk', filter=band)
+    for key, n in items.aggregate(**aggregates).items():
+        counts[tuple(key.split(':', 1))] = n
+    return counts
+
+
+def rebuild_facets():
+    counts = compute_facet_counts(Item.objects.all())
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(
+            FacetCount(facet=facet, value=value, count=n)
+            for (facet, value), n in counts.items() if n)
+
+
+def adjust_facets(pairs, delta):
+    """Add delta to the count of each (facet, value) pair."""
+    for facet, value in pairs:
+        if value is None:
+            continue
+        updated = FacetCount.objects.filter(
+            facet=facet, value=value).update(count=F('count') + delta)
+        if not updated and delta > 0:
+            FacetCount.objects.get_or_create(
+                facet=facet, value=value, defaults={'count': delta})
+
+
+def filter_items(queryset, params):
+    """Narrow an Item queryset by the facet values selected in params."""
+    if params.get('category'):
+        queryset = queryset.filter(category=params['category'])
+    if params.get('label'):
+        queryset = queryset.filter(label=params['label'])
+    if params.get('discount') == 'yes':
+        queryset = queryset.filter(discount_price__isnull=False)
+    elif params.get('discount') == 'no':
+        queryset = queryset.filter(discount_price__isnull=True)
+    for value, _, low, high in PRICE_BANDS:
+        if params.get('price') == value:
+            queryset = queryset.annotate(
+                effective_price=Coalesce('discount_price', 'price')
+            ).filter(effective_price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(effective_price__lt=high)
+    return queryset
+
+
+def facet_sidebar(params, names=None, counts=True):
+    """
+    Facets with their options, counts and selection state for templates.
+    names limits the facets shown; with counts=False each option's count
+    is None and FacetCount isn't read.
+    """
+    totals = {
+        (row.facet, row.value): row.count for row in FacetCount.objects.all()
+    } if counts else {}
+    sidebar = []
+    for name, title, choices in FACETS:
+        if names is not None and name not in names:
+            continue
+        options = [{
+            'value': value,
+            'title': option_title,
+            'count': totals.get((name, value), 0) if counts else None,
+            'selected': params.get(name) == value,
+        } for value, option_title in choices]
+        sidebar.append({
+            'name': name,
+            'title': title,
+            'options': options,
+            'selected': bool(params.get(name)),
+        })
+    return sidebar
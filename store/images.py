@@ -0,0 +1,89 @@
+"""
+Resized copies of Item images.
+
+Every original gets a JPEG and a WebP copy per width in SIZES, saved
+next to it under derivatives/ with a name derived from the original, so
+the same upload always maps to the same files.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    'card': 400,
+    'detail': 800,
+}
+
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def derivative_name(original_name, size, extension):
+    stem = os.path.splitext(original_name)[0]
+    return f'derivatives/{stem}-{size}.{extension}'
+
+
+def generate_derivatives(original_name, overwrite=False):
+    """
+    Write every size/format of one original. Returns how many files were
+    written; takes a name rather than an Item so it can run in a process
+    pool.
+    """
+    written = 0
+    with default_storage.open(original_name, 'rb') as original:
+        image = Image.open(original)
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    for size, width in SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 2), Image.LANCZOS)
+        for extension, (image_format, save_options) in FORMATS.items():
+            name = derivative_name(original_name, size, extension)
+            if default_storage.exists(name):
+                if not overwrite:
+                    continue
+                default_storage.delete(name)
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **save_options)
+            saved = default_storage.save(name, ContentFile(buffer.getvalue()))
+            if saved != name:
+                # Another render wrote it first and storage gave ours a new
+                # name; theirs is just as good, so drop the copy
+                default_storage.delete(saved)
+                continue
+            written += 1
+    return written
+
+
+def derivative_urls(original_name):
+    """
+    URLs of every derivative as {size: {extension: url}}, generating any
+    that are missing. Returns None if the original can't be processed.
+    """
+    names = {
+        size: {ext: derivative_name(original_name, size, ext) for ext in FORMATS}
+        for size in SIZES
+    }
+    missing = any(
+        not default_storage.exists(name)
+        for by_ext in names.values() for name in by_ext.values())
+    if missing:
+        try:
+            generate_derivatives(original_name)
+        except (OSError, ValueError) as e:
+            logger.warning('Could not resize %s: %s', original_name, e)
+            return None
+    return {
+        size: {ext: default_storage.url(name) for ext, name in by_ext.items()}
+        for size, by_ext in names.items()
+    }
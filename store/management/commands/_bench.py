@@ -0,0 +1,82 @@
+"""Shared helpers for the bench_* management commands."""
+import random
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.models import CATEGORY_CHOICES, LABEL_CHOICES, Item
+
+WORDS = (
+    'cotton linen denim wool silk fleece polo henley oxford flannel '
+    'jersey hoodie parka anorak blazer trench bomber windbreaker '
+    'slim relaxed classic vintage striped checked plain graphic '
+    'navy olive crimson charcoal ivory mustard teal burgundy '
+    'running training hiking cycling yoga tennis summer winter'
+).split()
+
+
+class BenchCommand(BaseCommand):
+    """
+    Base for the bench_* commands. They write throwaway rows into the
+    configured database, so they refuse to run unless DEBUG is on or
+    --yes confirms the database is a scratch one.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            '--yes', action='store_true',
+            help='Run even with DEBUG off, writing bench rows into the '
+                 'configured database')
+        return parser
+
+    def execute(self, *args, **options):
+        if not settings.DEBUG and not options.get('yes'):
+            raise CommandError(
+                'This benchmark writes to the configured database. Run it '
+                'with DEBUG on, or pass --yes if the database is a scratch one.')
+        return super().execute(*args, **options)
+
+
+def seed_items(count, batch_size=10000, stdout=None):
+    """Bulk insert `count` throwaway Item rows and return how many were added."""
+    categories = [choice for choice, _ in CATEGORY_CHOICES]
+    labels = [choice for choice, _ in LABEL_CHOICES]
+    start = Item.objects.count()
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        batch = []
+        for n in range(start + created, start + created + size):
+            price = Decimal(random.randint(500, 20000)) / 100
+            batch.append(Item(
+                title=' '.join(random.sample(WORDS, 3)).title(),
+                price=price,
+                discount_price=(price * Decimal('0.8')).quantize(Decimal('0.01'))
+                if n % 3 == 0 else None,
+                category=random.choice(categories),
+                label=random.choice(labels),
+                slug=f'bench-item-{n}',
+                description=' '.join(random.choices(WORDS, k=12)) + f' sku{n}',
+                image='12.jpg'))
+        with transaction.atomic():
+            Item.objects.bulk_create(batch)
+        created += size
+        if stdout is not None:
+            stdout.write(f'  seeded {created}/{count} items')
+    return created
+
+
+def timed(func, repeat=5):
+    """Run func `repeat` times and return the best wall time in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
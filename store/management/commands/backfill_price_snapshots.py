@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = ('Copy item prices into the snapshot columns of ordered lines '
+            'bought before snapshots existed, a chunk at a time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        pending = OrderItem.objects.filter(ordered=True, unit_price__isnull=True)
+        last_pk = 0
+        updated = 0
+        while True:
+            # Walk the primary key so each chunk is an index range scan
+            pks = list(pending.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', flat=True)[:options['chunk_size']])
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += OrderItem.objects.filter(
+                    pk__in=pks).snapshot_prices()
+            last_pk = pks[-1]
+            self.stdout.write(f'  backfilled {updated} lines')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {updated} lines'))
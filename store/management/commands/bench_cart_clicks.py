@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from store.models import Item
+
+from ._bench import BenchCommand, seed_items
+
+
+class Command(BenchCommand):
+    help = ('Time add-to-cart clicks through the whole request cycle for a '
+            'guest (signed cookie cart) and a logged in user (Order rows).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clicks', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if Item.objects.count() < 10:
+            seed_items(10 - Item.objects.count())
+        slugs = list(Item.objects.values_list('slug', flat=True)[:10])
+        user, _ = get_user_model().objects.get_or_create(
+            username='bench-cart-clicks')
+
+        guest = Client()
+        member = Client()
+        member.force_login(user)
+        clicks = options['clicks']
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, client in (('guest (cookie)', guest), ('logged in (db)', member)):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for n in range(clicks):
+                        client.get(f'/add-to-cart/{slugs[n % len(slugs)]}')
+                        # A browser shows the flash message on the redirect;
+                        # unread ones would overflow into the session table
+                        client.cookies.pop('messages', None)
+                    elapsed = time.perf_counter() - started
+                writes = sum(
+                    1 for query in queries.captured_queries
+                    if query['sql'].lstrip().upper().startswith(
+                        ('INSERT', 'UPDATE', 'DELETE')))
+                self.stdout.write(
+                    f'{name:<16} {elapsed / clicks * 1000:.2f} ms/click  '
+                    f'{len(queries) / clicks:.1f} queries/click  '
+                    f'{writes / clicks:.1f} writes/click')
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import Item, Order, OrderItem
+from store.payments import create_ref_code
+
+from ._bench import BenchCommand, seed_items, timed
+
+
+def seed_orders(count, per_user=10, batch_size=10000, stdout=None):
+    """
+    Insert `count` orders spread over count / per_user new users.
+
+    Each user gets one open order and per_user - 1 paid ones with unique
+    ref codes, which is the shape the cart lookups run against.
+    """
+    User = get_user_model()
+    now = timezone.now()
+    offset = User.objects.count()
+    users_needed = max(1, count // per_user)
+    for start in range(0, users_needed, batch_size):
+        stop = min(start + batch_size, users_needed)
+        with transaction.atomic():
+            User.objects.bulk_create(
+                User(username=f'bench-user-{offset + n}')
+                for n in range(start, stop))
+    user_ids = list(User.objects.filter(
+        username__startswith='bench-user-').order_by('-pk').values_list(
+            'pk', flat=True)[:users_needed])
+
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        batch = []
+        for n in range(created, created + size):
+            open_order = n < len(user_ids)
+            batch.append(Order(
+                user_id=user_ids[n % len(user_ids)],
+                ordered=not open_order,
+                ordered_date=now,
+                ref_code=None if open_order else create_ref_code()))
+        with transaction.atomic():
+            Order.objects.bulk_create(batch)
+        created += size
+        if stdout is not None:
+            stdout.write(f'  seeded {created}/{count} orders')
+
+
+class Command(BenchCommand):
+    help = ('Show query plans and latency for the hot cart lookups. '
+            'Run before and after migrating to compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-orders', type=int, default=0,
+                            help='Insert this many orders first (e.g. 1000000)')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['seed_orders']:
+            if not Item.objects.exists():
+                seed_items(100)
+            seed_orders(options['seed_orders'], stdout=self.stdout)
+
+        order = Order.objects.filter(ordered=False).order_by('-pk').first()
+        paid = Order.objects.filter(ref_code__isnull=False).order_by('-pk').first()
+        item = Item.objects.order_by('-pk').first()
+        if order is None or paid is None or item is None:
+            self.stderr.write('Need at least one open order, one paid order '
+                              'and one item. Use --seed-orders.')
+            return
+
+        lookups = [
+            ('open order by user',
+             Order.objects.filter(user_id=order.user_id, ordered=False)),
+            ('cart line by user and item',
+             OrderItem.objects.filter(
+                 user_id=order.user_id, item=item, ordered=False)),
+            ('order by ref_code',
+             Order.objects.filter(ref_code=paid.ref_code)),
+            ('item by slug',
+             Item.objects.filter(slug=item.slug)),
+        ]
+        for name, queryset in lookups:
+            elapsed = timed(lambda: list(queryset.all()), options['repeat'])
+            self.stdout.write(f'{name}: {elapsed:.3f} ms')
+            self.stdout.write('  ' + queryset.explain().replace('\n', '\n  '))
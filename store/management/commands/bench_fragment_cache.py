@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from store.models import Item
+
+from ._bench import BenchCommand, seed_items
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+LOCAL_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class Command(BenchCommand):
+    help = 'Render a 12-item home page repeatedly with and without fragment caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if Item.objects.count() < 12:
+            seed_items(12 - Item.objects.count())
+
+        template = get_template('store/home.html')
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        context = {'items': list(Item.objects.order_by('pk')[:12])}
+        renders = options['renders']
+
+        for label, caches in (('without fragment cache', NO_CACHE),
+                              ('with fragment cache', LOCAL_CACHE)):
+            with override_settings(CACHES=caches):
+                cache.clear()
+                template.render(context, request)  # warm up
+                started = time.perf_counter()
+                for _ in range(renders):
+                    template.render(context, request)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label}: {elapsed * 1000:.0f} ms for {renders} renders '
+                f'({elapsed / renders * 1000:.3f} ms each)')
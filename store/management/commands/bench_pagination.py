@@ -0,0 +1,58 @@
+from django.core.paginator import Paginator
+
+from store.models import Item
+from store.pagination import encode_cursor, paginate_by_cursor
+
+from ._bench import BenchCommand, seed_items, timed
+
+
+class Command(BenchCommand):
+    help = 'Compare offset and keyset pagination latency on the catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many Item rows first (e.g. 1000000)')
+        parser.add_argument('--page', type=int, default=50000,
+                            help='Deep page number to compare against page 1')
+        parser.add_argument('--per-page', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed_items(options['seed'], stdout=self.stdout)
+
+        per_page = options['per_page']
+        deep_page = options['page']
+        queryset = Item.objects.all()
+        total = queryset.count()
+        if total <= (deep_page - 1) * per_page:
+            self.stderr.write(
+                f'Only {total} items; page {deep_page} does not exist. '
+                f'Use --seed to add more.')
+            return
+
+        def offset_page(number):
+            # A fresh Paginator each run, so every run pays for the COUNT(*)
+            # as a request does; Paginator.count is cached on the instance
+            return lambda: list(
+                Paginator(queryset.order_by('pk'), per_page).page(number).object_list)
+
+        # The cursor a visitor would hold after clicking through to deep_page
+        last_pk = queryset.order_by('pk').values_list(
+            'pk', flat=True)[(deep_page - 1) * per_page - 1]
+        deep_cursor = encode_cursor([last_pk, 'n'])
+
+        def cursor_page(token):
+            return lambda: list(paginate_by_cursor(queryset, token, per_page))
+
+        repeat = options['repeat']
+        results = [
+            ('offset', 1, timed(offset_page(1), repeat)),
+            ('offset', deep_page, timed(offset_page(deep_page), repeat)),
+            ('cursor', 1, timed(cursor_page(None), repeat)),
+            ('cursor', deep_page, timed(cursor_page(deep_cursor), repeat)),
+        ]
+
+        self.stdout.write(f'{total} items, {per_page} per page, best of {repeat}')
+        for mode, number, elapsed in results:
+            self.stdout.write(f'{mode:>6}  page {number:>7}  {elapsed:8.2f} ms')
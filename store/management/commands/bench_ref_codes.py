@@ -0,0 +1,59 @@
+import random
+import statistics
+import time
+
+
+from store.models import Item, Order
+from store.payments import create_ref_code, find_order_by_ref_code
+
+from ._bench import BenchCommand, seed_items
+from .bench_cart_lookups import seed_orders
+
+
+class Command(BenchCommand):
+    help = ('Time ref code generation and the refund lookup by ref code. '
+            'Seed a realistic table first, e.g. --seed-orders 5000000.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-orders', type=int, default=0)
+        parser.add_argument('--samples', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['seed_orders']:
+            if not Item.objects.exists():
+                seed_items(100)
+            seed_orders(options['seed_orders'], stdout=self.stdout)
+
+        started = time.perf_counter()
+        codes = {create_ref_code() for _ in range(100000)}
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'generated 100000 codes in {elapsed * 1000:.0f} ms, '
+            f'{100000 - len(codes)} duplicates')
+
+        paid = Order.objects.filter(ref_code__isnull=False)
+        last_pk = paid.order_by('-pk').values_list('pk', flat=True).first()
+        if last_pk is None:
+            self.stderr.write('No paid orders. Use --seed-orders.')
+            return
+        self.stdout.write(f'{paid.count()} paid orders')
+
+        # Look up codes of random existing orders, then codes that don't exist
+        pks = [random.randint(1, last_pk) for _ in range(options['samples'])]
+        samples = {
+            'hit': list(paid.filter(pk__in=pks).values_list('ref_code', flat=True)),
+            'miss': [create_ref_code() for _ in range(options['samples'])],
+        }
+        for name, ref_codes in samples.items():
+            latencies = []
+            for ref_code in ref_codes:
+                started = time.perf_counter()
+                find_order_by_ref_code(ref_code)
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            self.stdout.write(
+                f'lookup {name}: p50 {statistics.median(latencies):.3f} ms  '
+                f'p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms '
+                f'({len(latencies)} lookups)')
+        self.stdout.write('  ' + Order.objects.filter(
+            ref_code=samples['miss'][0], ordered=True).values('pk').explain())
@@ -0,0 +1,40 @@
+from django.db.models import Q
+
+from store.models import Item
+from store.search import rebuild_search_index, search_items
+
+from ._bench import BenchCommand, seed_items, timed
+
+
+class Command(BenchCommand):
+    help = 'Compare indexed full-text search with naive icontains filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many Item rows first (e.g. 500000)')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('terms', nargs='*',
+                            default=['denim', 'slim navy parka', 'sku4242',
+                                     'nosuchthing'])
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed_items(options['seed'], stdout=self.stdout)
+            # bulk_create skips the signals that keep the index in step
+            rebuild_search_index()
+
+        self.stdout.write(f'{Item.objects.count()} items, best of {options["repeat"]}')
+        for term in options['terms']:
+            def indexed():
+                return list(search_items(term))
+
+            def naive():
+                queryset = Item.objects.all()
+                for word in term.split():
+                    queryset = queryset.filter(
+                        Q(title__icontains=word) | Q(description__icontains=word))
+                return list(queryset[:12])
+
+            self.stdout.write(
+                f'{term!r:<20} indexed {timed(indexed, options["repeat"]):8.2f} ms'
+                f'   icontains {timed(naive, options["repeat"]):8.2f} ms')
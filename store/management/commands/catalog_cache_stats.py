@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from store.cache import catalog_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Print hit/miss counters for the anonymous catalog page cache'
+
+    def handle(self, *args, **options):
+        stats = catalog_cache_stats()
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups * 100 if lookups else 0
+        self.stdout.write(
+            f"catalog version {stats['version']}: "
+            f"{stats['hits']} hits, {stats['misses']} misses "
+            f"({ratio:.1f}% hit rate)")
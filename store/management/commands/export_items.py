@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.catalog_io import FIELDS, FORMATS, guess_format, write_rows
+from store.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Stream every Item to a CSV or JSON Lines file that import_items reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='File to write (default: stdout)')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        rows = Item.objects.order_by('pk').values_list(*FIELDS).iterator(
+            chunk_size=options['chunk_size'])
+        if path == '-':
+            write_rows(sys.stdout, file_format, rows)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                write_rows(f, file_format, rows)
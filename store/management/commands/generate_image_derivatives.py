@@ -0,0 +1,42 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from store.images import generate_derivatives
+from store.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG/WebP copies of every Item image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Size of the process pool')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        names = sorted(set(
+            Item.objects.exclude(image='').values_list('image', flat=True)))
+        self.stdout.write(f'{len(names)} distinct images')
+
+        written = failed = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(generate_derivatives, name, options['overwrite']): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {e}')
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Wrote {written} files for {len(names) - failed} images '
+            f'({failed} failed) in {elapsed:.1f}s')
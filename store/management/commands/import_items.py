@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from store.cache import bump_catalog_version
+from store.catalog_io import (
+    FIELDS, FORMATS, clean_row, guess_format, ingest_image, read_rows)
+from store.facets import rebuild_facets
+from store.models import Item
+from store.search import rebuild_search_index
+
+UPDATE_FIELDS = [field for field in FIELDS if field != 'slug'] + ['updated_at']
+
+
+class Command(BaseCommand):
+    help = ('Create or update Items from a CSV or JSON Lines file, matched '
+            'on slug, streaming the file and writing in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Defaults to the file extension (.jsonl or csv)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--images-dir',
+                            help='Copy each row\'s image from here into media '
+                                 'storage and generate its derivatives')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes for image ingestion')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or guess_format(path)
+        self.created = self.updated = self.unchanged = self.errors = 0
+        self.images = self.image_errors = 0
+        self.pool = None
+        self.pending_images = []
+        if options['images_dir']:
+            self.images_dir = options['images_dir']
+            self.pool = ProcessPoolExecutor(max_workers=options['workers'])
+
+        started = time.perf_counter()
+        try:
+            f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with f:
+            batch = {}
+            for line_number, row in read_rows(f, file_format):
+                try:
+                    values = clean_row(row)
+                except ValueError as e:
+                    self.errors += 1
+                    if self.errors <= 20:
+                        self.stderr.write(f'line {line_number}: {e}')
+                    continue
+                # A slug repeated in the file: the last row wins
+                batch[values['slug']] = values
+                if len(batch) >= options['batch_size']:
+                    self.write_batch(batch, started)
+                    batch = {}
+            if batch:
+                self.write_batch(batch, started)
+
+        if self.pool is not None:
+            self.wait_for_images()
+            self.pool.shutdown()
+
+        # Bulk writes skip the Item signals, so refresh what they maintain
+        rebuild_search_index()
+        rebuild_facets()
+        bump_catalog_version()
+
+        elapsed = time.perf_counter() - started
+        rows = self.created + self.updated + self.unchanged
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.created} created, {self.updated} updated, '
+            f'{self.unchanged} unchanged, {self.errors} rejected in {elapsed:.1f}s '
+            f'({rows / elapsed:.0f} rows/sec)'))
+        if self.pool is not None:
+            self.stdout.write(
+                f'{self.images} image files written, {self.image_errors} images failed')
+
+    def write_batch(self, batch, started):
+        existing = {
+            row[1]: row for row in Item.objects.filter(
+                slug__in=list(batch)).values_list('pk', *FIELDS)
+        }
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for slug, values in batch.items():
+            item = Item(**values)
+            if slug not in existing:
+                to_create.append(item)
+            elif existing[slug][1:] != tuple(values[field] for field in FIELDS):
+                # Only rows that changed, so re-importing a catalog is cheap
+                item.pk = existing[slug][0]
+                item.updated_at = now
+                to_update.append(item)
+            else:
+                self.unchanged += 1
+
+        with transaction.atomic():
+            Item.objects.bulk_create(to_create)
+            Item.objects.bulk_update(to_update, UPDATE_FIELDS)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+        if self.pool is not None:
+            # At most two batches of images in flight keeps memory bounded
+            self.wait_for_images()
+            names = {values['image'] for values in batch.values() if values['image']}
+            self.pending_images = [
+                self.pool.submit(ingest_image, self.images_dir, name)
+                for name in names]
+
+        rows = self.created + self.updated + self.unchanged
+        self.stdout.write(
+            f'  {rows} rows, {rows / (time.perf_counter() - started):.0f} rows/sec')
+
+    def wait_for_images(self):
+        for future in wait(self.pending_images).done:
+            try:
+                self.images += future.result()
+            except (OSError, ValueError) as e:
+                self.image_errors += 1
+                if self.image_errors <= 20:
+                    self.stderr.write(f'image: {e}')
+        self.pending_images = []
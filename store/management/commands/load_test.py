@@ -0,0 +1,76 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def fetch(host, port, path, cookie):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = [f'GET {path} HTTP/1.1', f'Host: {host}', 'Connection: close']
+    if cookie:
+        request.append(f'Cookie: {cookie}')
+    writer.write(('\r\n'.join(request) + '\r\n\r\n').encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def run(base_url, paths, total, concurrency, cookie):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    queue = asyncio.Queue()
+    for n in range(total):
+        queue.put_nowait(paths[n % len(paths)])
+    statuses = {}
+    latencies = []
+
+    async def worker():
+        while not queue.empty():
+            path = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                status = await fetch(host, port, path, cookie)
+            except OSError:
+                status = 'error'
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, statuses, sorted(latencies)
+
+
+class Command(BaseCommand):
+    help = ('Hammer one or more running servers with concurrent GETs and '
+            'report requests/sec, e.g. gunicorn (WSGI) on :8000 against '
+            'uvicorn workers (ASGI) on :8001.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_urls', nargs='+')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request; repeat for a mix (default /)')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--cookie', default='',
+                            help='Cookie header to send, e.g. sessionid=... '
+                                 'for the cart and order summary pages')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/']
+        self.stdout.write(
+            f'{options["requests"]} requests, {options["concurrency"]} '
+            f'concurrent, paths: {", ".join(paths)}')
+        for base_url in options['base_urls']:
+            if not urlsplit(base_url).hostname:
+                raise CommandError(f'Not a URL: {base_url}')
+            elapsed, statuses, latencies = asyncio.run(run(
+                base_url, paths, options['requests'],
+                options['concurrency'], options['cookie']))
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            self.stdout.write(
+                f'{base_url:<30} {len(latencies) / elapsed:>8.1f} req/s  '
+                f'p50 {p50:>7.1f} ms  p99 {p99:>7.1f} ms  {statuses}')
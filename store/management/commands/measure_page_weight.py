@@ -0,0 +1,68 @@
+import gzip
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_RE = re.compile(r'(?:src|href)="([^"]+)"')
+
+
+def compressed_size(data):
+    sizes = [len(data), len(gzip.compress(data, 9))]
+    if brotli is not None:
+        sizes.append(len(brotli.compress(data)))
+    return min(sizes)
+
+
+def asset_path(url):
+    """Local file behind a /static/ or /media/ URL, or None."""
+    url = url.split('?')[0]
+    if url.startswith(settings.STATIC_URL):
+        name = url[len(settings.STATIC_URL):]
+        collected = os.path.join(settings.STATIC_ROOT, name)
+        return collected if os.path.exists(collected) else finders.find(name)
+    if url.startswith(settings.MEDIA_URL):
+        return os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Add up the bytes a browser downloads for a page: raw files vs '
+            'the best pre-compressed copy (gzip or brotli).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='/')
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            response = Client().get(options['path'])
+        html = response.content
+
+        raw_total = len(html)
+        compressed_total = compressed_size(html)
+        self.stdout.write(
+            f'{"page":<60} {raw_total:>10} {compressed_total:>10}')
+
+        for url in sorted(set(ASSET_RE.findall(html.decode()))):
+            path = asset_path(url)
+            if not path or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            raw_total += len(data)
+            compressed = compressed_size(data)
+            compressed_total += compressed
+            self.stdout.write(f'{url:<60} {len(data):>10} {compressed:>10}')
+
+        self.stdout.write(
+            f'{"total bytes (raw / compressed)":<60} '
+            f'{raw_total:>10} {compressed_total:>10}')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.payments import process_pending_payments
+
+
+class Command(BaseCommand):
+    help = 'Charge pending payments through Stripe (the payment job queue worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Make one pass over the queue and exit')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_payments()
+            if processed:
+                self.stdout.write(f'Processed {processed} payments')
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
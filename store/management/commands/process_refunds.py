@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.refunds import process_refunds
+
+
+class Command(BaseCommand):
+    help = 'Issue queued Stripe refunds from a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Refunds sent to Stripe at once')
+        parser.add_argument('--once', action='store_true',
+                            help='Make one pass over the queue and exit')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            outcomes = process_refunds(workers=options['workers'])
+            total = sum(outcomes.values())
+            if total:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{total} refunds in {elapsed:.1f}s ({total / elapsed:.1f}/sec): '
+                    f'{outcomes["S"]} succeeded, {outcomes["F"]} failed, '
+                    f'{outcomes["P"]} to retry')
+            if options['once']:
+                break
+            if not total:
+                time.sleep(options['sleep'])
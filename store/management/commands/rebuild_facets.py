@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.facets import rebuild_facets
+from store.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the catalog facet counts from the Item table'
+
+    def handle(self, *args, **options):
+        rebuild_facets()
+        self.stdout.write(f'{FacetCount.objects.count()} facet values counted')
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Serve a stand-in for the Stripe charges and refunds APIs that '
+            'answers after a fixed delay. Point STRIPE_API_BASE at it to load '
+            'test the payment and refund workers without real network calls.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--delay', type=float, default=0.3,
+                            help='Seconds to wait before answering, like a real charge')
+
+    def handle(self, *args, **options):
+        delay = options['delay']
+        # Like Stripe, replay the first response for a repeated key
+        responses = {}
+
+        async def respond(reader, writer):
+            headers = {}
+            request_line = (await reader.readline()).decode()
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.lower()] = value.strip()
+            await reader.readexactly(int(headers.get('content-length', 0)))
+
+            key = headers.get('idempotency-key')
+            body = responses.get(key)
+            if body is None:
+                await asyncio.sleep(delay)
+                if '/v1/refunds' in request_line:
+                    body = {'id': f're_{uuid.uuid4().hex[:24]}', 'object': 'refund'}
+                else:
+                    body = {'id': f'ch_{uuid.uuid4().hex[:24]}', 'object': 'charge',
+                            'paid': True}
+                body.update(status='succeeded', created=int(time.time()))
+                body = json.dumps(body).encode()
+                if key:
+                    responses[key] = body
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                b'Connection: close\r\n'
+                b'Content-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+            writer.close()
+
+        async def serve():
+            server = await asyncio.start_server(
+                respond, '127.0.0.1', options['port'])
+            self.stdout.write(
+                f'Stripe stub listening on http://127.0.0.1:{options["port"]}')
+            async with server:
+                await server.serve_forever()
+
+        asyncio.run(serve())
@@ -0,0 +1,127 @@
+"""
+Request middleware for the store.
+
+GuestCartMiddleware keeps logged out visitors' carts in a cookie; see
+GuestCart in store/cart.py.
+
+QueryBudgetMiddleware counts the SQL queries a request makes and times
+them, the template rendering and the whole request. It logs one line per
+request to the 'store.queries' logger, optionally adds a Server-Timing
+header, and checks the query count against settings.QUERY_BUDGETS (keyed
+by URL name). With QUERY_BUDGET_ENABLED off the middleware removes itself
+at startup, so it costs nothing.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import Template
+
+from .cart import GuestCart
+
+logger = logging.getLogger('store.queries')
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            return render(self, context)
+        # Includes and extends render nested templates; time the outermost
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = settings.QUERY_BUDGETS
+        self.action = settings.QUERY_BUDGET_ACTION
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        total_time = time.perf_counter() - started
+
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        size = len(response.content) if not response.streaming else None
+        logger.info(
+            'view=%s status=%s queries=%d db_ms=%.1f template_ms=%.1f '
+            'total_ms=%.1f bytes=%s', url_name or request.path,
+            response.status_code, stats.queries, stats.db_time * 1000,
+            stats.template_time * 1000, total_time * 1000, size)
+
+        if settings.QUERY_BUDGET_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'tpl;dur={stats.template_time * 1000:.1f}, '
+                f'total;dur={total_time * 1000:.1f}')
+
+        budget = self.budgets.get(url_name)
+        if budget is not None and stats.queries > budget:
+            message = (f'{url_name} made {stats.queries} queries, '
+                       f'over its budget of {budget}')
+            if self.action == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class GuestCartMiddleware:
+    """
+    Load a logged out visitor's cart from its cookie onto
+    request.guest_cart, and write the cookie back (or delete it, after
+    the cart is merged on login) when the request changed it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.guest_cart = GuestCart.from_request(request)
+        response = self.get_response(request)
+        request.guest_cart.save(response)
+        return response
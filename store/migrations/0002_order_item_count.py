@@ -0,0 +1,31 @@
+# Generated by Django 3.0.3 on 2026-10-18 09:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_item_count(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    orders = Order.objects.filter(ordered=False).annotate(lines=Count('items'))
+    for order in orders:
+        Order.objects.filter(pk=order.pk).update(item_count=order.lines)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='address',
+            options={'verbose_name_plural': 'Addresses'},
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_item_count, migrations.RunPython.noop),
+    ]
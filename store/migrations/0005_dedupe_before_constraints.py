@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def dedupe(apps, schema_editor):
+    Item = apps.get_model('store', 'Item')
+    Order = apps.get_model('store', 'Order')
+
+    # Unpaid orders never had a reference code; store NULL so the unique
+    # index on ref_code only covers real codes
+    Order.objects.filter(ref_code='').update(ref_code=None)
+
+    duplicate_slugs = Item.objects.values('slug').annotate(
+        n=Count('pk')).filter(n__gt=1).values_list('slug', flat=True)
+    for slug in list(duplicate_slugs):
+        for item in Item.objects.filter(slug=slug).order_by('pk')[1:]:
+            item.slug = f'{slug}-{item.pk}'
+            item.save(update_fields=['slug'])
+
+    # Fold extra open orders into the oldest one so each user has one cart
+    users = Order.objects.filter(ordered=False).values('user').annotate(
+        n=Count('pk')).filter(n__gt=1).values_list('user', flat=True)
+    for user_id in list(users):
+        keep, *extra = Order.objects.filter(
+            user_id=user_id, ordered=False).order_by('pk')
+        for order in extra:
+            keep.items.add(*order.items.all())
+            order.delete()
+        keep.item_count = keep.items.count()
+        keep.save(update_fields=['item_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_order_ref_code_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+    ]
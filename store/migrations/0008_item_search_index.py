@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Must match the to_tsvector() that SearchVector('title', 'description',
+# config='english') compiles to, or PostgreSQL won't use the index
+PG_SEARCH_EXPRESSION = (
+    "to_tsvector('english'::regconfig, "
+    "COALESCE(title, '') || ' ' || COALESCE(description, ''))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX store_item_search_idx ON store_item '
+            f'USING GIN ({PG_SEARCH_EXPRESSION})')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE store_item_fts USING fts5(title, description)')
+        schema_editor.execute(
+            'INSERT INTO store_item_fts (rowid, title, description) '
+            'SELECT id, title, description FROM store_item')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS store_item_search_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS store_item_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_item_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.3 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+def populate_facets(apps, schema_editor):
+    from store.facets import compute_facet_counts
+    Item = apps.get_model('store', 'Item')
+    FacetCount = apps.get_model('store', 'FacetCount')
+    counts = compute_facet_counts(Item.objects.all())
+    FacetCount.objects.bulk_create(
+        FacetCount(facet=facet, value=value, count=n)
+        for (facet, value), n in counts.items() if n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_item_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='unique_facet_value'),
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.3 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_facetcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='error_message',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=36, null=True, unique=True),
+        ),
+        # Payments made before the queue existed were charged in the request
+        migrations.AddField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('P', 'Pending'), ('R', 'Processing'), ('S', 'Succeeded'), ('F', 'Failed')], default='S', max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('P', 'Pending'), ('R', 'Processing'), ('S', 'Succeeded'), ('F', 'Failed')], default='P', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='stripe_token',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='stripe_charge_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -1,10 +1,16 @@
 from django.conf import settings
 from django.shortcuts import reverse
 from django.db import models
+from django.db.models import (
+    ExpressionWrapper, F, OuterRef, Subquery, Sum, Value)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 from django_countries.fields import CountryField
 
+from .pricing import ZERO, OrderPricing
+
 # Create your models here.
 
 CATEGORY_CHOICES = (
@@ -24,16 +30,26 @@ ADDRESS_CHOICES = (
     ('S', 'Shipping Address')
 )
 
+PAYMENT_STATUS_CHOICES = (
+    ('P', 'Pending'),
+    ('R', 'Processing'),
+    ('S', 'Succeeded'),
+    ('F', 'Failed')
+)
+
 
 class Item(models.Model):
     title = models.CharField(max_length=100)
-    price = models.FloatField()
-    discount_price = models.FloatField(blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_price = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True)
     category = models.CharField(choices=CATEGORY_CHOICES, max_length=2)
     label = models.CharField(choices=LABEL_CHOICES, max_length=1)
-    slug = models.SlugField()
+    slug = models.SlugField(unique=True)
     description = models.TextField()
     image = models.ImageField()
+    # Bumped on every save; versions the cached product card fragments
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -48,6 +64,26 @@ class Item(models.Model):
         return reverse("remove-from-cart", kwargs={"slug": self.slug})
 
 
+class OrderItemQuerySet(models.QuerySet):
+    def snapshot_prices(self, **extra):
+        """
+        Copy each line's current item prices into its snapshot columns,
+        in a single UPDATE. Extra keyword arguments are set as well.
+        """
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        item = Item.objects.filter(pk=OuterRef('item_id'))
+        price = Subquery(item.values('price'), output_field=money)
+        discount_price = Subquery(
+            item.values('discount_price'), output_field=money)
+        return self.update(
+            unit_price=price,
+            unit_discount_price=discount_price,
+            line_total=ExpressionWrapper(
+                F('quantity') * Coalesce(discount_price, price),
+                output_field=money),
+            **extra)
+
+
 class OrderItem(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -55,30 +91,89 @@ class OrderItem(models.Model):
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
     ordered = models.BooleanField(default=False)
+    # Prices as charged, copied from the item when payment is submitted
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True)
+    unit_discount_price = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True)
+    line_total = models.DecimalField(
+        max_digits=12, decimal_places=2, blank=True, null=True)
+
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'item', 'ordered']),
+        ]
 
     def __str__(self):
         return f'{self.quantity} of {self.item.title}'
 
+    def get_unit_prices(self):
+        """(price, discount_price) as charged, or the item's live prices."""
+        if self.unit_price is not None:
+            return self.unit_price, self.unit_discount_price
+        return self.item.price, self.item.discount_price
+
     def get_item_total(self):
-        return self.quantity * self.item.price
+        return self.quantity * self.get_unit_prices()[0]
 
     def get_item_total_discount(self):
-        return self.quantity * self.item.discount_price
+        return self.quantity * self.get_unit_prices()[1]
 
     def get_amount_saved(self):
         return self.get_item_total() - self.get_item_total_discount()
 
     def get_final_price(self):
-        if self.item.discount_price:
+        if self.line_total is not None:
+            return self.line_total
+        if self.get_unit_prices()[1]:
             return self.get_item_total_discount()
         return self.get_item_total()
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """Fetch the coupon, lines and their products along with the orders."""
+        return self.select_related('coupon').prefetch_related(
+            models.Prefetch(
+                'items', queryset=OrderItem.objects.select_related('item')))
+
+    def with_totals(self):
+        """
+        Annotate subtotal, savings, coupon_deduction and total in SQL.
+
+        Mirrors OrderPricing, but as one GROUP BY over the order lines so
+        totals for any number of orders come back in a single statement.
+        """
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        # Paid lines carry their price snapshot; open ones use live prices
+        quantity = F('items__quantity')
+        full_price = quantity * Coalesce(
+            'items__unit_price', 'items__item__price')
+        final_price = Coalesce(
+            'items__line_total',
+            quantity * Coalesce(
+                'items__item__discount_price', 'items__item__price'))
+        return self.annotate(
+            subtotal=Coalesce(
+                Sum(full_price, output_field=money), Value(ZERO), output_field=money),
+            total_before_coupon=Coalesce(
+                Sum(final_price, output_field=money), Value(ZERO), output_field=money),
+            coupon_deduction=Coalesce(
+                'coupon__amount', Value(ZERO), output_field=money),
+        ).annotate(
+            savings=F('subtotal') - F('total_before_coupon'),
+            total=F('total_before_coupon') - F('coupon_deduction'),
+        )
+
+
 class Order(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE)
-    ref_code = models.CharField(max_length=20)
+    ref_code = models.CharField(
+        max_length=20, unique=True, blank=True, null=True)
     items = models.ManyToManyField(OrderItem)
     start_date = models.DateTimeField(default=timezone.now)
     ordered_date = models.DateTimeField()
@@ -105,17 +200,32 @@ class Order(models.Model):
     delivered = models.BooleanField(default=False)
     refund_requested = models.BooleanField(default=False)
     refund_granted = models.BooleanField(default=False)
+    # Number of lines in items, kept in step by the cart views so the
+    # navbar badge doesn't have to count the M2M on every page
+    item_count = models.PositiveIntegerField(default=0)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'ordered']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(ordered=False),
+                name='unique_open_order_per_user'),
+        ]
 
     def __str__(self):
         return self.user.username
 
+    @cached_property
+    def pricing(self):
+        return OrderPricing(self)
+
     def get_order_total(self):
-        total = 0
-        for order_item in self.items.all():
-            total += order_item.get_final_price()
-        if self.coupon:
-            total -= self.coupon.amount
-        return total
+        return self.pricing.total
 
 
 class Address(models.Model):
@@ -140,13 +250,24 @@ class Address(models.Model):
 
 
 class Payment(models.Model):
-    stripe_charge_id = models.CharField(max_length=100)
+    # Indexed for the admin's exact charge id search
+    stripe_charge_id = models.CharField(max_length=100, blank=True, db_index=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
         blank=True, null=True)
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(default=timezone.now)
+    # Charges are made by the process_payments worker, not in the request
+    status = models.CharField(
+        max_length=1, choices=PAYMENT_STATUS_CHOICES, default='P')
+    idempotency_key = models.CharField(
+        max_length=36, unique=True, blank=True, null=True)
+    stripe_token = models.CharField(max_length=100, blank=True)
+    error_message = models.CharField(max_length=255, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    amount_refunded = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0)
 
     def __str__(self):
         return self.user.username
@@ -154,7 +275,7 @@ class Payment(models.Model):
 
 class Coupon(models.Model):
     code = models.CharField(max_length=15)
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
         return self.code
@@ -165,6 +286,32 @@ class Refund(models.Model):
     reason = models.TextField()
     accepted = models.BooleanField(default=False)
     email = models.EmailField()
+    # Accepted refunds are issued by the process_refunds worker
+    status = models.CharField(
+        max_length=1, choices=PAYMENT_STATUS_CHOICES, default='P')
+    amount = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True)
+    idempotency_key = models.CharField(
+        max_length=36, unique=True, blank=True, null=True)
+    stripe_refund_id = models.CharField(max_length=100, blank=True)
+    error_message = models.CharField(max_length=255, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return f'{self.pk}'
+
+
+class FacetCount(models.Model):
+    """How many items carry each facet value; see store/facets.py."""
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['facet', 'value'], name='unique_facet_value'),
+        ]
+
+    def __str__(self):
+        return f'{self.facet}={self.value}: {self.count}'
@@ -0,0 +1,136 @@
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+def encode_cursor(position):
+    """Turn a list of ordering values into an opaque ?cursor= token."""
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Returns None for a missing or garbled token."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = json.loads(raw.decode())
+    except ValueError:
+        return None
+    if not isinstance(position, list):
+        return None
+    return position
+
+
+class CursorPage:
+    """
+    Page object for keyset pagination.
+
+    Mirrors the bits of django.core.paginator.Page that the templates use,
+    but never counts the underlying table: it only knows whether there is
+    a page before and after it.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_by_cursor(queryset, token, per_page):
+    """
+    Keyset pagination on the primary key.
+
+    A cursor is [pk, direction] where direction is 'n' (rows after pk) or
+    'p' (rows before pk). Every page is a single indexed range scan of
+    per_page + 1 rows, so page 50,000 costs the same as page 1.
+    """
+    position = decode_cursor(token)
+    pk, direction = None, 'n'
+    if (position and len(position) == 2 and isinstance(position[0], int)
+            and position[1] in ('n', 'p')):
+        pk, direction = position
+
+    if direction == 'p':
+        rows = list(queryset.filter(pk__lt=pk).order_by('-pk')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+        has_previous = has_more
+    else:
+        if pk is not None:
+            queryset = queryset.filter(pk__gt=pk)
+        rows = list(queryset.order_by('pk')[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = pk is not None
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor([rows[-1].pk, 'n'])
+    if rows and has_previous:
+        previous_cursor = encode_cursor([rows[0].pk, 'p'])
+    return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate for an unfiltered queryset's table, or None
+    where there isn't one (filtered querysets, no statistics gathered yet).
+    """
+    if not isinstance(queryset, QuerySet) or queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'sqlite':
+        # Filled in by ANALYZE. Each row starts with the row count of the
+        # table or one of its indexes; partial indexes count fewer
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    estimate = max((int(str(stat).split()[0]) for stat, in rows), default=0)
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips the COUNT(*) over big unfiltered tables and uses
+    the database's own estimate instead. Small tables and filtered lists
+    are still counted exactly.
+    """
+    exact_count_below = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= self.exact_count_below:
+            return estimate
+        return super().count
@@ -0,0 +1,210 @@
+"""
+Stripe payments, charged by a background worker.
+
+PaymentView only records a pending Payment carrying the card token and
+an idempotency key; `manage.py process_payments` claims pending payments
+and makes the Stripe calls. Stripe's idempotency keys mean a payment that
+gets retried (after a network error or a worker crash) is charged at
+most once.
+"""
+import secrets
+import time
+import uuid
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem, Payment
+from .pricing import to_minor_units
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
+
+PENDING = 'P'
+PROCESSING = 'R'
+SUCCEEDED = 'S'
+FAILED = 'F'
+
+# A payment still processing after this long is assumed to belong to a
+# worker that died, and is handed out again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Errors worth retrying with the same idempotency key
+TRANSIENT_ERRORS = (stripe.error.RateLimitError, stripe.error.APIConnectionError)
+
+REF_CODE_ALPHABET = '0123456789abcdefghjkmnpqrstvwxyz'
+REF_CODE_ATTEMPTS = 3
+
+
+def create_ref_code(now=None):
+    """
+    A 20 character, lower case Crockford base32 code: 10 characters of
+    millisecond timestamp, so new codes land at the end of the ref_code
+    index, then 10 characters (50 bits) from the secrets module.
+    """
+    if now is None:
+        now = time.time()
+    value = (int(now * 1000) << 50) | secrets.randbits(50)
+    code = []
+    for _ in range(20):
+        value, digit = divmod(value, 32)
+        code.append(REF_CODE_ALPHABET[digit])
+    return ''.join(reversed(code))
+
+
+def submit_payment(order, token):
+    """
+    Snapshot the order's line prices and record a pending payment for
+    their total, or return the payment already waiting, so a resubmitted
+    form can't queue a second charge. A pending payment for a different
+    amount than the freshly priced cart is superseded by a new one.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_related('payment').select_for_update(
+            of=('self',)).get(pk=order.pk)
+        payment = order.payment
+        if payment is not None and payment.status in (PROCESSING, SUCCEEDED):
+            return payment
+
+        # The lines keep these prices, and the cart stays frozen, until the
+        # payment succeeds or fails
+        OrderItem.objects.filter(order=order).snapshot_prices()
+        amount = Order.objects.with_items().get(pk=order.pk).get_order_total()
+        if payment is not None and payment.status == PENDING:
+            if payment.amount == amount:
+                return payment
+            superseded = Payment.objects.filter(
+                pk=payment.pk, status=PENDING
+            ).update(status=FAILED, stripe_token='',
+                     error_message='Superseded by a new payment')
+            if not superseded:
+                # A worker claimed it first and charges it as queued, so
+                # keep the snapshot it was priced from
+                transaction.set_rollback(True)
+                payment.refresh_from_db()
+                return payment
+
+        payment = Payment.objects.create(
+            user=order.user,
+            amount=amount,
+            idempotency_key=str(uuid.uuid4()),
+            stripe_token=token or '')
+        order.payment = payment
+        order.save(update_fields=['payment'])
+        return payment
+
+
+def claim_next_payment(exclude=()):
+    """Mark the oldest claimable payment as processing and return it."""
+    now = timezone.now()
+    stale = now - CLAIM_TIMEOUT
+    candidates = (
+        Payment.objects.filter(status=PENDING)
+        | Payment.objects.filter(status=PROCESSING, claimed_at__lt=stale)
+    ).exclude(pk__in=exclude)
+    for pk in candidates.order_by('pk').values_list('pk', flat=True)[:10]:
+        # The conditional UPDATE is the lock: only one worker can win it
+        claimed = Payment.objects.filter(
+            pk=pk, status=PENDING
+        ).update(status=PROCESSING, claimed_at=now)
+        if not claimed:
+            claimed = Payment.objects.filter(
+                pk=pk, status=PROCESSING, claimed_at__lt=stale
+            ).update(claimed_at=now)
+        if claimed:
+            return Payment.objects.get(pk=pk)
+    return None
+
+
+def assign_ref_code(orders, **extra):
+    """
+    Give the orders a fresh ref code, retrying if the unique constraint
+    turns one down (with 50 random bits per millisecond, vanishingly rare).
+    """
+    for attempt in range(REF_CODE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return orders.update(ref_code=create_ref_code(), **extra)
+        except IntegrityError:
+            if attempt == REF_CODE_ATTEMPTS - 1:
+                raise
+
+
+def find_order_by_ref_code(ref_code):
+    """The pk of the paid order with this ref code, or None."""
+    ref_code = (ref_code or '').strip().lower()
+    return Order.objects.filter(
+        ref_code=ref_code, ordered=True).values_list('pk', flat=True).first()
+
+
+def fulfil_order(payment, charge_id):
+    """
+    Mark the payment, its order and every line as paid, dating the order
+    from now rather than from when the cart was opened. The line prices
+    were snapshotted by submit_payment, so this is three UPDATEs in one
+    transaction, whatever the cart size.
+    """
+    with transaction.atomic():
+        Payment.objects.filter(pk=payment.pk).update(
+            stripe_charge_id=charge_id, status=SUCCEEDED, stripe_token='')
+        OrderItem.objects.filter(order__payment=payment).update(ordered=True)
+        assign_ref_code(
+            Order.objects.filter(payment=payment),
+            ordered=True, ordered_date=timezone.now())
+
+
+def fail_payment(payment, message):
+    """Fail the payment and put the order's lines back on live prices."""
+    with transaction.atomic():
+        payment.status = FAILED
+        payment.error_message = message[:255]
+        payment.stripe_token = ''
+        payment.save()
+        OrderItem.objects.filter(order__payment=payment, ordered=False).update(
+            unit_price=None, unit_discount_price=None, line_total=None)
+
+
+def charge_payment(payment):
+    try:
+        charge = stripe.Charge.create(
+            amount=to_minor_units(payment.amount),   # cents
+            currency="inr",
+            source=payment.stripe_token,
+            idempotency_key=payment.idempotency_key
+        )
+    except stripe.error.CardError as e:
+        # Since it's a decline, stripe.error.CardError will be caught
+        err = e.json_body.get('error', {})
+        fail_payment(payment, f'{err.get("message")}')
+    except TRANSIENT_ERRORS:
+        # Put it back in the queue; the idempotency key makes the retry safe
+        Payment.objects.filter(pk=payment.pk).update(status=PENDING)
+    except stripe.error.InvalidRequestError:
+        fail_payment(payment, 'Invalid parameters')
+    except stripe.error.AuthenticationError:
+        fail_payment(payment, 'Not authenticated')
+    except stripe.error.StripeError:
+        fail_payment(
+            payment, 'Something went wrong. You were not charged. Please try again')
+    else:
+        fulfil_order(payment, charge['id'])
+    payment.refresh_from_db()
+    return payment
+
+
+def process_pending_payments(limit=None):
+    """
+    One pass over the queue: charge each claimable payment once. Returns
+    how many were attempted; transient failures wait for the next pass.
+    """
+    attempted = []
+    while limit is None or len(attempted) < limit:
+        payment = claim_next_payment(exclude=attempted)
+        if payment is None:
+            break
+        charge_payment(payment)
+        attempted.append(payment.pk)
+    return len(attempted)
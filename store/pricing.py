@@ -0,0 +1,44 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+# Prices are DecimalFields with two places; keep all arithmetic in Decimal
+# so totals never pick up float rounding error.
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def to_minor_units(amount):
+    """Convert a Decimal amount to integer cents, as Stripe expects."""
+    return int((amount / CENT).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class OrderPricing:
+    """
+    Prices an order in a single pass over its lines.
+
+    Built once per Order instance (see Order.pricing) so templates and
+    views can ask for totals as often as they like without going back to
+    the database. Load the order with Order.objects.with_items() so the
+    lines and their products arrive already joined.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        if 'items' in getattr(order, '_prefetched_objects_cache', {}):
+            self.lines = list(order.items.all())
+        else:
+            self.lines = list(order.items.select_related('item'))
+
+        self.subtotal = ZERO
+        self.savings = ZERO
+        self.total_before_coupon = ZERO
+        for line in self.lines:
+            self.subtotal += line.get_item_total()
+            if line.get_unit_prices()[1]:
+                self.savings += line.get_amount_saved()
+            self.total_before_coupon += line.get_final_price()
+
+        self.coupon_amount = order.coupon.amount if order.coupon_id else ZERO
+        self.total = self.total_before_coupon - self.coupon_amount
+
+    def __len__(self):
+        return len(self.lines)
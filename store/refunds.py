@@ -0,0 +1,146 @@
+"""
+Stripe refunds, issued in batches by a background worker.
+
+Staff grant refunds from the order admin, which only queues them:
+queue_refunds() marks each order's Refund as accepted and gives it an
+idempotency key. `manage.py process_refunds` claims queued refunds and
+calls Stripe from a bounded thread pool. A claimed refund that never
+finished (the worker was killed) is claimed again after CLAIM_TIMEOUT
+and retried with the same key, so Stripe refunds it at most once.
+"""
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Order, Payment, Refund
+from .payments import (
+    CLAIM_TIMEOUT, FAILED, PENDING, PROCESSING, SUCCEEDED, TRANSIENT_ERRORS)
+from .pricing import to_minor_units
+
+STAFF_REASON = 'Granted by staff'
+
+
+def queue_refunds(orders):
+    """
+    Queue a full refund for each paid, not yet refunded order. Returns how
+    many were queued; orders already queued or refunded are skipped.
+    """
+    eligible = orders.filter(
+        ordered=True, refund_granted=False, payment__status=SUCCEEDED
+    ).exclude(payment__stripe_charge_id='')
+    with transaction.atomic():
+        # Lock through a plain queryset: the admin passes in with_totals(),
+        # and PostgreSQL refuses FOR UPDATE on a GROUP BY
+        orders = list(Order.objects.filter(
+            pk__in=eligible.order_by().values('pk')
+        ).select_related('user').select_for_update(of=('self',)))
+        # In flight or done already; a failed refund can be queued again
+        busy = set(Refund.objects.filter(
+            order__in=orders, idempotency_key__isnull=False
+        ).exclude(status=FAILED).values_list('order_id', flat=True))
+        requested = {
+            refund.order_id: refund for refund in Refund.objects.filter(
+                order__in=orders).exclude(status=SUCCEEDED).order_by('pk')
+        }
+        to_update = []
+        to_create = []
+        for order in orders:
+            if order.pk in busy:
+                continue
+            refund = requested.get(order.pk) or Refund(
+                order=order, reason=STAFF_REASON, email=order.user.email)
+            refund.accepted = True
+            refund.status = PENDING
+            refund.error_message = ''
+            refund.idempotency_key = str(uuid.uuid4())
+            (to_update if refund.pk else to_create).append(refund)
+        Refund.objects.bulk_update(
+            to_update, ['accepted', 'status', 'error_message', 'idempotency_key'])
+        Refund.objects.bulk_create(to_create)
+    return len(to_update) + len(to_create)
+
+
+def claim_refunds(limit, exclude=()):
+    """Mark up to limit queued refunds as processing and return their pks."""
+    now = timezone.now()
+    stale = now - CLAIM_TIMEOUT
+    candidates = Refund.objects.filter(
+        Q(status=PENDING) | Q(status=PROCESSING, claimed_at__lt=stale),
+        accepted=True, idempotency_key__isnull=False,
+    ).exclude(pk__in=exclude).order_by('pk').values_list('pk', flat=True)
+    claimed = []
+    for pk in candidates[:limit]:
+        # The conditional UPDATE is the lock: only one worker can win it
+        if Refund.objects.filter(
+            Q(status=PENDING) | Q(status=PROCESSING, claimed_at__lt=stale), pk=pk
+        ).update(status=PROCESSING, claimed_at=now):
+            claimed.append(pk)
+    return claimed
+
+
+def record_refund(refund, stripe_refund_id, amount):
+    with transaction.atomic():
+        Refund.objects.filter(pk=refund.pk).update(
+            status=SUCCEEDED, stripe_refund_id=stripe_refund_id,
+            amount=amount, error_message='')
+        Payment.objects.filter(pk=refund.order.payment_id).update(
+            amount_refunded=F('amount_refunded') + amount)
+        Order.objects.filter(pk=refund.order_id).update(
+            refund_requested=False, refund_granted=True)
+
+
+def fail_refund(refund, message):
+    Refund.objects.filter(pk=refund.pk).update(
+        status=FAILED, error_message=message[:255])
+
+
+def issue_refund(pk):
+    """Refund one claimed Refund through Stripe. Runs in a worker thread."""
+    try:
+        refund = Refund.objects.select_related('order__payment').get(pk=pk)
+        payment = refund.order.payment
+        amount = payment.amount - payment.amount_refunded
+        try:
+            stripe_refund = stripe.Refund.create(
+                charge=payment.stripe_charge_id,
+                amount=to_minor_units(amount),   # cents
+                idempotency_key=refund.idempotency_key
+            )
+        except TRANSIENT_ERRORS:
+            # Back in the queue; the idempotency key makes the retry safe
+            Refund.objects.filter(pk=pk).update(status=PENDING)
+            return PENDING
+        except stripe.error.StripeError as e:
+            err = (e.json_body or {}).get('error', {})
+            fail_refund(refund, err.get('message') or str(e) or 'Refund failed')
+            return FAILED
+        record_refund(refund, stripe_refund['id'], amount)
+        return SUCCEEDED
+    finally:
+        # Each thread has its own connection; don't leave them open
+        connection.close()
+
+
+def process_refunds(workers=8, limit=None):
+    """
+    One pass over the queue, workers refunds at a time. Returns a Counter
+    of outcomes by status; transient failures wait for the next pass.
+    """
+    outcomes = Counter()
+    attempted = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while limit is None or len(attempted) < limit:
+            size = workers * 2
+            if limit is not None:
+                size = min(size, limit - len(attempted))
+            pks = claim_refunds(size, exclude=attempted)
+            if not pks:
+                break
+            attempted.extend(pks)
+            outcomes.update(pool.map(issue_refund, pks))
+    return outcomes
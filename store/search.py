@@ -0,0 +1,121 @@
+"""
+Full-text product search over Item.title and Item.description.
+
+PostgreSQL matches against a GIN expression index on the same
+to_tsvector() that SearchVector builds. SQLite keeps an FTS5 table,
+store_item_fts, whose rowid is the Item pk; the Item signals keep it in
+step, and rebuild_search_index() refills it after bulk loads.
+
+Results come back best match first, in keyset pages whose cursor is the
+last row's (score, pk).
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Q
+
+from .models import Item
+from .pagination import CursorPage, decode_cursor, encode_cursor
+
+FTS_TABLE = 'store_item_fts'
+SEARCH_CONFIG = 'english'
+
+
+def _uses_fts5():
+    return connection.vendor == 'sqlite'
+
+
+def index_item(item):
+    if _uses_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [item.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+                f'VALUES (%s, %s, %s)',
+                [item.pk, item.title, item.description])
+
+
+def unindex_item(pk):
+    if _uses_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_search_index():
+    """Refill the FTS5 table from store_item (no-op on PostgreSQL)."""
+    if _uses_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+                f'SELECT id, title, description FROM store_item')
+
+
+def _fts5_query(text):
+    # Quote every word so user input can't trip FTS5's query syntax
+    return ' '.join('"%s"' % word.replace('"', '""') for word in text.split())
+
+
+def _search_fts5(text, category, after, limit):
+    sql = [
+        f'SELECT {FTS_TABLE}.rowid, {FTS_TABLE}.rank FROM {FTS_TABLE}',
+        f'JOIN store_item ON store_item.id = {FTS_TABLE}.rowid',
+        f'WHERE {FTS_TABLE} MATCH %s',
+    ]
+    params = [_fts5_query(text)]
+    if category:
+        sql.append('AND store_item.category = %s')
+        params.append(category)
+    if after:
+        sql.append(f'AND ({FTS_TABLE}.rank > %s OR '
+                   f'({FTS_TABLE}.rank = %s AND {FTS_TABLE}.rowid > %s))')
+        params.extend([after[0], after[0], after[1]])
+    sql.append(f'ORDER BY {FTS_TABLE}.rank, {FTS_TABLE}.rowid LIMIT %s')
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        hits = cursor.fetchall()
+    items = Item.objects.in_bulk([pk for pk, _ in hits])
+    return [(items[pk], score) for pk, score in hits if pk in items]
+
+
+def _search_postgres(text, category, after, limit):
+    vector = SearchVector('title', 'description', config=SEARCH_CONFIG)
+    query = SearchQuery(text, config=SEARCH_CONFIG)
+    # Negate the rank so that, as with FTS5, a lower score is a better match
+    queryset = Item.objects.annotate(
+        search=vector, score=-SearchRank(vector, query)).filter(search=query)
+    if category:
+        queryset = queryset.filter(category=category)
+    if after:
+        queryset = queryset.filter(
+            Q(score__gt=after[0]) | Q(score=after[0], pk__gt=after[1]))
+    return [(item, item.score)
+            for item in queryset.order_by('score', 'pk')[:limit]]
+
+
+def search_items(text, category=None, cursor=None, per_page=12):
+    """Return a CursorPage of Items matching text, best match first."""
+    text = (text or '').strip()
+    if not text:
+        return CursorPage([])
+
+    position = decode_cursor(cursor)
+    after = None
+    # The token comes from the query string, so check its types before
+    # they reach SQL; bool passes isinstance(int) and is refused
+    if (position and len(position) == 2
+            and isinstance(position[0], (int, float))
+            and isinstance(position[1], int)
+            and not any(isinstance(value, bool) for value in position)):
+        after = position
+
+    search = _search_fts5 if _uses_fts5() else _search_postgres
+    hits = search(text, category, after, per_page + 1)
+
+    next_cursor = None
+    if len(hits) > per_page:
+        hits = hits[:per_page]
+        last_item, last_score = hits[-1]
+        next_cursor = encode_cursor([last_score, last_item.pk])
+    return CursorPage([item for item, _ in hits], next_cursor)
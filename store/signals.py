@@ -0,0 +1,54 @@
+from collections import Counter
+
+from allauth.account.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .cart import merge_items
+from .facets import adjust_facets, facet_values
+from .models import Item
+from .search import index_item, unindex_item
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Item)
+def update_search_index(sender, instance, **kwargs):
+    index_item(instance)
+
+
+@receiver(post_delete, sender=Item)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_item(instance.pk)
+
+
+@receiver(pre_save, sender=Item)
+def remember_facet_values(sender, instance, **kwargs):
+    previous = Item.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._previous_facet_values = facet_values(previous) if previous else []
+
+
+@receiver(post_save, sender=Item)
+def update_facet_counts(sender, instance, **kwargs):
+    before = Counter(getattr(instance, '_previous_facet_values', []))
+    after = Counter(facet_values(instance))
+    adjust_facets(before - after, -1)
+    adjust_facets(after - before, 1)
+
+
+@receiver(post_delete, sender=Item)
+def remove_facet_counts(sender, instance, **kwargs):
+    adjust_facets(facet_values(instance), -1)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    guest_cart = getattr(request, 'guest_cart', None)
+    # Keep the cookie if the merge was refused, to try again next login
+    if guest_cart and merge_items(user, guest_cart.lines) is not None:
+        guest_cart.clear()
@@ -5,9 +5,10 @@ register = template.Library()
 
 
 @register.filter
-def cart_item_count(user):
-    if user.is_authenticated:
-        qs = Order.objects.filter(user=user, ordered=False)
-        if qs.exists():
-            return qs[0].items.count()
-    return 0
+def cart_item_count(request):
+    if request.user.is_authenticated:
+        count = Order.objects.filter(
+            user=request.user, ordered=False
+        ).values_list('item_count', flat=True).first()
+        return count or 0
+    return len(getattr(request, 'guest_cart', ()))
@@ -0,0 +1,22 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_string(context, *pairs, **kwargs):
+    """
+    The current query string with some parameters replaced, so paging
+    links keep the search and filters they were rendered with. Passing
+    None drops a parameter. Positional arguments are read as key, value
+    pairs for when the key itself is a variable.
+    """
+    params = context['request'].GET.copy()
+    kwargs.update(zip(pairs[::2], pairs[1::2]))
+    for key, value in kwargs.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = str(value)
+    encoded = params.urlencode()
+    return f'?{encoded}' if encoded else '?'
@@ -0,0 +1,29 @@
+from django import template
+
+from store.images import SIZES, derivative_urls
+
+register = template.Library()
+
+
+@register.inclusion_tag('store/picture-snippet.html')
+def item_picture(item, size='card', css_class='img-fluid', sizes=None):
+    """
+    <picture> for an item's image with WebP and JPEG srcsets, falling back
+    to the original file if its derivatives can't be made.
+    """
+    context = {
+        'original_url': item.image.url if item.image else '',
+        'css_class': css_class,
+        'alt': item.title,
+        'sizes': sizes or f'{SIZES[size]}px',
+    }
+    urls = derivative_urls(item.image.name) if item.image else None
+    if urls:
+        context.update({
+            'src': urls[size]['jpg'],
+            'jpg_srcset': ', '.join(
+                f"{urls[name]['jpg']} {width}w" for name, width in SIZES.items()),
+            'webp_srcset': ', '.join(
+                f"{urls[name]['webp']} {width}w" for name, width in SIZES.items()),
+        })
+    return context
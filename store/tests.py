@@ -1,3 +1,494 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import stripe
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from . import cart, images, payments, refunds
+from .models import Address, Coupon, Item, Order, OrderItem, Payment, Refund
+from .pagination import encode_cursor
 
 # Create your tests here.
+
+LOCAL_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def make_items(count, price='10.00', discount_price=None):
+    return [
+        Item.objects.create(
+            title=f'Shirt {n}', price=Decimal(price),
+            discount_price=discount_price and Decimal(discount_price),
+            category='S', label='P', slug=f'shirt-{n}',
+            description='cotton shirt', image='12.jpg')
+        for n in range(count)
+    ]
+
+
+@override_settings(CACHES=LOCAL_CACHE, ALLOWED_HOSTS=['testserver'])
+class StoreTestCase(TestCase):
+    # Catalog pages resize item images as they render; keep the resized
+    # copies out of the real MEDIA_ROOT
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        shutil.copy(os.path.join(settings.MEDIA_ROOT, '12.jpg'), cls.media_root)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root)
+
+    def setUp(self):
+        cache.clear()
+
+
+class SearchViewTests(StoreTestCase):
+    def test_search_page_keeps_category_navbar(self):
+        make_items(2)
+        response = self.client.get('/search/?q=shirt')
+        self.assertEqual(len(response.context['object_list']), 2)
+        self.assertContains(response, 'category=S')
+        self.assertContains(response, '>All<')
+
+    def test_search_ignores_a_tampered_cursor(self):
+        make_items(2)
+        for position in ([[1], 5], ['x', 5], [True, 5], [1.5, False]):
+            response = self.client.get(
+                '/search/', {'q': 'shirt', 'cursor': encode_cursor(position)})
+            self.assertEqual(len(response.context['object_list']), 2)
+
+    def test_search_page_only_offers_the_category_facet(self):
+        make_items(2)
+        response = self.client.get('/search/?q=shirt')
+        self.assertEqual(
+            [facet['name'] for facet in response.context['facets']], ['category'])
+        self.assertNotContains(response, '?q=shirt&amp;label=')
+        self.assertNotContains(response, 'badge-pill badge-light')
+
+
+class CatalogCacheStatsTests(StoreTestCase):
+    def test_hits_are_counted_without_writing_to_the_cache(self):
+        make_items(1)
+        before = catalog_cache.catalog_cache_stats()
+        cache.delete(catalog_cache.STATS_KEY)
+
+        self.client.get('/')
+        self.client.get('/')
+        self.assertIsNone(cache.get(catalog_cache.STATS_KEY))
+
+        after = catalog_cache.catalog_cache_stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    def test_parallel_adds_all_land(self):
+        user = get_user_model().objects.create_user('shopper', password='pw')
+        item, = make_items(1)
+        errors = []
+
+        def click():
+            try:
+                cart.add_item(user, item)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        order = Order.objects.get(user=user, ordered=False)
+        self.assertEqual(order.item_count, 1)
+        self.assertEqual(order.items.get().quantity, 10)
+
+
+def card_error(message):
+    return stripe.error.CardError(
+        message, None, 'card_declined', json_body={'error': {'message': message}})
+
+
+@mock.patch('store.payments.stripe.Charge.create')
+class PaymentTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user('shopper', password='pw')
+        self.items = make_items(2)
+        for item in self.items:
+            cart.add_item(self.user, item)
+        self.order = Order.objects.get(user=self.user, ordered=False)
+
+    def test_successful_charge_fulfils_the_order(self, create):
+        create.return_value = {'id': 'ch_1'}
+        payment = payments.submit_payment(self.order, 'tok_visa')
+
+        self.assertEqual(payments.process_pending_payments(), 1)
+        create.assert_called_once_with(
+            amount=2000, currency='inr', source='tok_visa',
+            idempotency_key=payment.idempotency_key)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, payments.SUCCEEDED)
+        self.assertEqual(payment.stripe_charge_id, 'ch_1')
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.ordered)
+        self.assertEqual(len(self.order.ref_code), 20)
+        self.assertGreaterEqual(self.order.ordered_date, payment.timestamp)
+
+    def test_declined_card_fails_the_payment(self, create):
+        create.side_effect = card_error('Your card was declined.')
+        payment = payments.submit_payment(self.order, 'tok_declined')
+
+        payments.process_pending_payments()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, payments.FAILED)
+        self.assertEqual(payment.error_message, 'Your card was declined.')
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.ordered)
+        self.assertEqual(cart.add_item(self.user, self.items[0]), cart.UPDATED)
+
+    def test_transient_error_is_retried_with_the_same_key(self, create):
+        create.side_effect = [
+            stripe.error.APIConnectionError('connection reset'), {'id': 'ch_2'}]
+        payment = payments.submit_payment(self.order, 'tok_visa')
+
+        payments.process_pending_payments()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, payments.PENDING)
+
+        payments.process_pending_payments()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, payments.SUCCEEDED)
+        keys = [call.kwargs['idempotency_key'] for call in create.call_args_list]
+        self.assertEqual(keys, [payment.idempotency_key] * 2)
+
+    def test_stale_claim_is_recovered(self, create):
+        create.return_value = {'id': 'ch_3'}
+        payment = payments.submit_payment(self.order, 'tok_visa')
+        Payment.objects.filter(pk=payment.pk).update(
+            status=payments.PROCESSING, claimed_at=timezone.now())
+        self.assertEqual(payments.process_pending_payments(), 0)
+
+        Payment.objects.filter(pk=payment.pk).update(
+            claimed_at=timezone.now() - payments.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(payments.process_pending_payments(), 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, payments.SUCCEEDED)
+
+    def test_cart_is_frozen_while_payment_is_pending(self, create):
+        payments.submit_payment(self.order, 'tok_visa')
+        item = self.items[0]
+        self.assertEqual(cart.add_item(self.user, item), cart.PAYMENT_PENDING)
+        self.assertEqual(cart.decrement_item(self.user, item), cart.PAYMENT_PENDING)
+        self.assertEqual(cart.remove_item(self.user, item), cart.PAYMENT_PENDING)
+        self.assertIsNone(cart.merge_items(self.user, {item.pk: 1}))
+        self.assertEqual(self.order.items.get(item=item).quantity, 1)
+
+    def test_submit_snapshots_prices_until_the_payment_fails(self, create):
+        create.side_effect = card_error('Your card was declined.')
+        payment = payments.submit_payment(self.order, 'tok_visa')
+        Item.objects.filter(pk=self.items[0].pk).update(price=Decimal('15.00'))
+
+        lines = OrderItem.objects.filter(order=self.order)
+        self.assertEqual(sum(line.line_total for line in lines), payment.amount)
+        self.assertEqual(Order.objects.with_items().get(
+            pk=self.order.pk).get_order_total(), Decimal('20.00'))
+
+        payments.process_pending_payments()
+        self.assertFalse(lines.filter(line_total__isnull=False).exists())
+        self.assertEqual(Order.objects.with_items().get(
+            pk=self.order.pk).get_order_total(), Decimal('25.00'))
+
+    def test_checkout_and_coupon_refused_while_payment_is_pending(self, create):
+        coupon = Coupon.objects.create(code='SAVE5', amount=Decimal('5.00'))
+        payment = payments.submit_payment(self.order, 'tok_visa')
+        self.client.force_login(self.user)
+
+        response = self.client.post('/checkout/', {'payment_option': 'S'})
+        self.assertRedirects(
+            response, f'/payment/status/{payment.pk}/', fetch_redirect_response=False)
+        self.client.post('/add_coupon/', {'code': 'SAVE5'})
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.coupon)
+
+        payments.fail_payment(payment, 'Declined')
+        self.assertEqual(cart.apply_coupon(self.user, coupon), cart.UPDATED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.coupon, coupon)
+
+    def test_resubmitting_reuses_the_pending_payment(self, create):
+        first = payments.submit_payment(self.order, 'tok_visa')
+        self.assertEqual(payments.submit_payment(self.order, 'tok_visa'), first)
+
+    def test_changed_total_supersedes_the_pending_payment(self, create):
+        first = payments.submit_payment(self.order, 'tok_visa')
+        Item.objects.filter(pk=self.items[0].pk).update(price=Decimal('15.00'))
+
+        second = payments.submit_payment(self.order, 'tok_visa')
+        self.assertNotEqual(second, first)
+        self.assertEqual(second.amount, Decimal('25.00'))
+        first.refresh_from_db()
+        self.assertEqual(first.status, payments.FAILED)
+
+
+class FulfilmentTests(StoreTestCase):
+    def test_fulfil_query_count_does_not_grow_with_lines(self):
+        user = get_user_model().objects.create_user('shopper', password='pw')
+        items = make_items(200)
+        OrderItem.objects.bulk_create(
+            OrderItem(user=user, item=item, quantity=2) for item in items)
+        order = Order.objects.create(
+            user=user, ordered_date=timezone.now(), item_count=len(items))
+        order.items.set(OrderItem.objects.filter(user=user))
+        payment = payments.submit_payment(order, 'tok_visa')
+        self.assertEqual(payment.amount, Decimal('4000.00'))
+
+        with self.assertNumQueries(7):
+            payments.fulfil_order(payment, 'ch_1')
+        self.assertEqual(
+            OrderItem.objects.filter(order=order, ordered=True).count(), 200)
+
+
+class MergeGuestCartTests(StoreTestCase):
+    def test_merge_ignores_orphaned_lines(self):
+        user = get_user_model().objects.create_user('shopper', password='pw')
+        kept, added, orphaned = make_items(3)
+        cart.add_item(user, kept)
+        OrderItem.objects.create(user=user, item=orphaned, quantity=5)
+
+        self.assertEqual(cart.merge_items(
+            user, {kept.pk: 2, added.pk: 1, orphaned.pk: 3}), 3)
+
+        order = Order.objects.get(user=user, ordered=False)
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(
+            sorted(order.items.values_list('item_id', 'quantity')),
+            [(kept.pk, 3), (added.pk, 1), (orphaned.pk, 3)])
+
+
+class HomePageQueryTests(StoreTestCase):
+    def test_authenticated_home_page_query_count(self):
+        user = get_user_model().objects.create_user('shopper', password='pw')
+        items = make_items(20)
+        for item in items[:3]:
+            cart.add_item(user, item)
+        self.client.force_login(user)
+
+        # Session, user, paginator count, facets, cart badge, items
+        with self.assertNumQueries(6):
+            response = self.client.get('/')
+        self.assertEqual(len(response.context['object_list']), 12)
+
+
+class OrderSummaryQueryTests(StoreTestCase):
+    def test_order_summary_query_count_does_not_grow_with_lines(self):
+        user = get_user_model().objects.create_user('shopper', password='pw')
+        items = make_items(100, discount_price='8.00')
+        cart.merge_items(user, {item.pk: 2 for item in items})
+        self.client.force_login(user)
+
+        # Session, user, order, its lines with their items, cart badge
+        with self.assertNumQueries(5):
+            response = self.client.get('/order-summary/')
+        self.assertEqual(len(response.context['order'].items.all()), 100)
+        self.assertContains(response, '1600')
+
+
+class AdminChangelistQueryTests(StoreTestCase):
+    """Each changelist's query count should not grow with the rows shown."""
+
+    @classmethod
+    def setUpTestData(cls):
+        item, = make_items(1)
+        coupon = Coupon.objects.create(code='SAVE10', amount=Decimal('10.00'))
+        for n in range(20):
+            user = get_user_model().objects.create_user(f'shopper-{n}')
+            shipping, billing = (
+                Address.objects.create(
+                    user=user, street_address='1 Main St', apartment_address='1',
+                    country='IN', zip_code='110001', address_type=address_type)
+                for address_type in 'SB')
+            payment = Payment.objects.create(
+                user=user, amount=item.price, status=payments.SUCCEEDED)
+            order = Order.objects.create(
+                user=user, ordered=True, ordered_date=timezone.now(),
+                payment=payment, coupon=coupon, item_count=1,
+                shipping_address=shipping, billing_address=billing)
+            order.items.add(OrderItem.objects.create(
+                user=user, item=item, ordered=True))
+            Refund.objects.create(order=order, reason='Too small', email='a@b.c')
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueries(self, model, count):
+        with self.assertNumQueries(count):
+            response = self.client.get(f'/admin/store/{model}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_item_changelist(self):
+        self.assertChangelistQueries('item', 5)
+
+    def test_orderitem_changelist(self):
+        self.assertChangelistQueries('orderitem', 5)
+
+    def test_order_changelist(self):
+        self.assertChangelistQueries('order', 5)
+
+    def test_address_changelist(self):
+        self.assertChangelistQueries('address', 5)
+
+    def test_payment_changelist(self):
+        self.assertChangelistQueries('payment', 5)
+
+    def test_coupon_changelist(self):
+        self.assertChangelistQueries('coupon', 5)
+
+    def test_refund_changelist(self):
+        self.assertChangelistQueries('refund', 5)
+
+
+class BenchCommandTests(StoreTestCase):
+    def test_bench_commands_refuse_to_run_without_debug(self):
+        with self.assertRaisesMessage(CommandError, 'pass --yes'):
+            call_command('bench_pagination', seed=10)
+        self.assertFalse(Item.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHE, ALLOWED_HOSTS=['testserver'])
+@mock.patch('store.refunds.stripe.Refund.create')
+class RefundTests(TransactionTestCase):
+    # Refunds are issued from worker threads, which need committed rows
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            'shopper', email='shopper@example.com', password='pw')
+        self.payment = Payment.objects.create(
+            user=user, amount=Decimal('20.00'), status=payments.SUCCEEDED,
+            stripe_charge_id='ch_1')
+        self.order = Order.objects.create(
+            user=user, ordered=True, ordered_date=timezone.now(),
+            payment=self.payment, ref_code=payments.create_ref_code())
+
+    def queue(self):
+        return refunds.queue_refunds(Order.objects.all())
+
+    def test_queue_skips_refunds_in_flight(self, create):
+        self.assertEqual(self.queue(), 1)
+        self.assertEqual(self.queue(), 0)
+        refund = Refund.objects.get()
+        self.assertTrue(refund.accepted)
+        self.assertEqual(refund.status, payments.PENDING)
+        self.assertEqual(refund.email, 'shopper@example.com')
+
+    def test_successful_refund_is_recorded(self, create):
+        create.return_value = {'id': 're_1'}
+        self.queue()
+        refund = Refund.objects.get()
+
+        self.assertEqual(refunds.process_refunds(workers=1), {payments.SUCCEEDED: 1})
+        create.assert_called_once_with(
+            charge='ch_1', amount=2000, idempotency_key=refund.idempotency_key)
+        refund.refresh_from_db()
+        self.assertEqual(refund.stripe_refund_id, 're_1')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.amount_refunded, Decimal('20.00'))
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.refund_granted)
+        self.assertEqual(self.queue(), 0)
+
+    def test_transient_error_is_retried_with_the_same_key(self, create):
+        create.side_effect = [
+            stripe.error.APIConnectionError('connection reset'), {'id': 're_2'}]
+        self.queue()
+
+        self.assertEqual(refunds.process_refunds(workers=1), {payments.PENDING: 1})
+        self.assertEqual(refunds.process_refunds(workers=1), {payments.SUCCEEDED: 1})
+        key = Refund.objects.get().idempotency_key
+        keys = [call.kwargs['idempotency_key'] for call in create.call_args_list]
+        self.assertEqual(keys, [key, key])
+
+    def test_stale_claim_is_recovered(self, create):
+        create.return_value = {'id': 're_3'}
+        self.queue()
+        Refund.objects.update(
+            status=payments.PROCESSING, claimed_at=timezone.now())
+        self.assertEqual(refunds.process_refunds(workers=1), {})
+
+        Refund.objects.update(
+            claimed_at=timezone.now() - payments.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(refunds.process_refunds(workers=1), {payments.SUCCEEDED: 1})
+
+    def test_failed_refund_can_be_granted_again(self, create):
+        create.side_effect = [
+            stripe.error.InvalidRequestError('No such charge', 'charge'),
+            {'id': 're_4'}]
+        self.queue()
+        first_key = Refund.objects.get().idempotency_key
+        self.assertEqual(refunds.process_refunds(workers=1), {payments.FAILED: 1})
+        self.assertEqual(Refund.objects.get().error_message, 'No such charge')
+
+        self.assertEqual(self.queue(), 1)
+        refund = Refund.objects.get()
+        self.assertNotEqual(refund.idempotency_key, first_key)
+        self.assertEqual(refunds.process_refunds(workers=1), {payments.SUCCEEDED: 1})
+
+    def test_grant_refunds_admin_action(self, create):
+        admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+
+        response = self.client.post('/admin/store/order/', {
+            'action': 'grant_refunds', '_selected_action': [self.order.pk]})
+        self.assertRedirects(response, '/admin/store/order/')
+        refund = Refund.objects.get(order=self.order)
+        self.assertTrue(refund.accepted)
+        self.assertEqual(refund.status, payments.PENDING)
+
+
+class ImageDerivativeTests(StoreTestCase):
+    def test_racing_generation_leaves_no_extra_copies(self):
+        self.assertEqual(images.generate_derivatives('12.jpg'), 4)
+
+        # A second render whose check for each file ran before the first
+        # render saved it
+        exists = default_storage.exists
+        checked = set()
+
+        def stale_exists(name):
+            if name in checked:
+                return exists(name)
+            checked.add(name)
+            return False
+
+        with mock.patch.object(default_storage, 'exists', stale_exists):
+            self.assertEqual(images.generate_derivatives('12.jpg'), 0)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.media_root, 'derivatives'))),
+            ['12-card.jpg', '12-card.webp', '12-detail.jpg', '12-detail.webp'])
@@ -6,6 +6,7 @@ from django.urls import path
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home-page'),
     path('product/<slug>', views.ItemDetailView.as_view(), name='product-page'),
+    path('search/', views.SearchView.as_view(), name='search-page'),
     path('add-to-cart/<slug>', views.add_to_cart, name='add-to-cart'),
     path('add-item-to-cart/<slug>',
          views.add_single_item_to_cart, name='add-item-to-cart'),
@@ -21,6 +22,9 @@ urlpatterns = [
     path('checkout/', views.CheckoutView.as_view(), name='checkout-page'),
     path('payment/<payment_option>/',
          views.PaymentView.as_view(), name='payment-page'),
+    path('payment/status/<int:pk>/',
+         views.PaymentStatusView.as_view(), name='payment-status'),
     path('request-refund/',
-         views.RequestRefundView.as_view(), name='request-refund')
+         views.RequestRefundView.as_view(), name='request-refund'),
+    path('orders/export.csv', views.export_orders, name='export-orders')
 ]
@@ -1,36 +1,82 @@
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.dateparse import parse_date
 from django.views.generic import ListView, DetailView, View
-from django.utils import timezone
 
+from . import cart, payments
+from .cache import AnonymousCacheMixin
+from .exports import orders_csv_response
+from .facets import facet_sidebar, filter_items
 from .forms import CheckoutForm, CouponForm, RefundRequestForm
-from .models import Item, Order, OrderItem, Address, Payment, Coupon, Refund
-import random
-import string
-
-import stripe
+from .models import Item, Order, Address, Payment, Coupon, Refund
+from .pagination import paginate_by_cursor
+from .search import search_items
 
 # Create your views here.
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
-def create_ref_code():
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=20))
+class HomeView(AnonymousCacheMixin, ListView):
+    cache_prefix = 'home'
+    template_name = 'store/home.html'
+    model = Item
+    context_object_name = 'items'
+
+    paginate_by = 12
+
+    def paginate_queryset(self, queryset, page_size):
+        # Keyset mode skips the COUNT(*) and OFFSET of the default paginator
+        if not settings.CATALOG_CURSOR_PAGINATION:
+            return super().paginate_queryset(queryset, page_size)
+        page = paginate_by_cursor(
+            queryset, self.request.GET.get('cursor'), page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_queryset(self):
+        return filter_items(super().get_queryset(), self.request.GET)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = settings.CATALOG_CURSOR_PAGINATION
+        context['facets'] = facet_sidebar(self.request.GET)
+        return context
 
 
-class HomeView(ListView):
+class SearchView(AnonymousCacheMixin, ListView):
+    cache_prefix = 'search'
     template_name = 'store/home.html'
     model = Item
     context_object_name = 'items'
 
     paginate_by = 12
 
-
-class ItemDetailView(DetailView):
+    def paginate_queryset(self, queryset, page_size):
+        page = search_items(
+            self.request.GET.get('q'),
+            category=self.request.GET.get('category'),
+            cursor=self.request.GET.get('cursor'),
+            per_page=page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = True
+        context['search_query'] = self.request.GET.get('q', '')
+        # search_items only narrows by category, and the FacetCount totals
+        # are for the whole catalog, not the matches
+        context['facets'] = facet_sidebar(
+            self.request.GET, names=['category'], counts=False)
+        return context
+
+
+class ItemDetailView(AnonymousCacheMixin, DetailView):
+    cache_prefix = 'product'
     model = Item
     template_name = 'store/product.html'
     context_object_name = 'item'
@@ -39,7 +85,8 @@ class ItemDetailView(DetailView):
 class OrderSummaryView(LoginRequiredMixin, View):
     def get(self, *args, **kwargs):
         try:
-            order = Order.objects.get(user=self.request.user, ordered=False)
+            order = Order.objects.with_items().get(
+                user=self.request.user, ordered=False)
             context = {
                 'order': order
             }
@@ -53,7 +100,8 @@ class CheckoutView(LoginRequiredMixin, View):
     def get(self, *args, **kwargs):
         form = CheckoutForm()
         try:
-            order = Order.objects.get(user=self.request.user, ordered=False)
+            order = Order.objects.with_items().get(
+                user=self.request.user, ordered=False)
         except ObjectDoesNotExist:
             messages.warning(self.request, "You do not have an active order")
             return redirect('home-page')
@@ -89,10 +137,16 @@ class CheckoutView(LoginRequiredMixin, View):
     def post(self, *args, **kwargs):
         form = CheckoutForm(self.request.POST or None)
         try:
-            order = Order.objects.get(user=self.request.user, ordered=False)
+            order = Order.objects.select_related('payment').get(
+                user=self.request.user, ordered=False)
         except ObjectDoesNotExist:
             messages.warning(self.request, "You do not have an active order")
             return redirect('home-page')
+        if cart.payment_pending(order):
+            messages.warning(
+                self.request,
+                'Your cart can not change while your payment is processing')
+            return redirect('payment-status', pk=order.payment_id)
         if form.is_valid():
 
             use_default_shipping = form.cleaned_data.get(
@@ -202,9 +256,11 @@ class CheckoutView(LoginRequiredMixin, View):
 
                     billing_address.save()
 
+            # Only these columns: the payment worker may have fulfilled
+            # the order since it was read
             order.shipping_address = shipping_address
             order.billing_address = billing_address
-            order.save()
+            order.save(update_fields=['shipping_address', 'billing_address'])
 
             payment_option = form.cleaned_data.get('payment_option')
 
@@ -222,7 +278,8 @@ class CheckoutView(LoginRequiredMixin, View):
 
 class PaymentView(LoginRequiredMixin, View):
     def get(self, *args, **kwargs):
-        order = Order.objects.get(user=self.request.user, ordered=False)
+        order = Order.objects.with_items().get(
+            user=self.request.user, ordered=False)
         if order.billing_address:
             context = {
                 'order': order,
@@ -236,104 +293,60 @@ class PaymentView(LoginRequiredMixin, View):
             return redirect('checkout-page')
 
     def post(self, *args, **kwargs):
-        order = Order.objects.get(
-            user=self.request.user,
-            ordered=False
-        )
+        try:
+            order = Order.objects.get(user=self.request.user, ordered=False)
+        except ObjectDoesNotExist:
+            messages.warning(self.request, "You do not have an active order")
+            return redirect('home-page')
         token = self.request.POST.get('stripeToken')
-        amount = int(order.get_order_total() * 100)
 
-        try:
-            # Use Stripe's library to make requests...
-            charge = stripe.Charge.create(
-                amount=amount,   # cents
-                currency="inr",
-                source=token
-            )
-
-            # create the payment
-            payment = Payment()
-            payment.stripe_charge_id = charge['id']
-            payment.user = self.request.user
-            payment.amount = order.get_order_total()
-            payment.save()
-
-            # update the ordered items
-            order_items = order.items.all()
-            order_items.update(ordered=True)
-            map(lambda item: item.save(), order_items)
-
-            # assign the payment to the order
-            order.ordered = True
-            order.payment = payment
-
-            # generate the order reference code
-            order.ref_code = create_ref_code()
-
-            order.save()
+        # The charge itself is made by the process_payments worker
+        payment = payments.submit_payment(order, token)
+        return redirect('payment-status', pk=payment.pk)
 
-            messages.success(self.request, 'Your order was successful')
 
-        except stripe.error.CardError as e:
-            # Since it's a decline, stripe.error.CardError will be caught
-            body = e.json_body
-            err = body.get('error', {})
-            messages.error(self.request, f'{err.get("message")}')
-        except stripe.error.RateLimitError as e:
-            # Too many requests made to the API too quickly
-            messages.error(self.request, 'Rate Limit Error')
-
-        except stripe.error.InvalidRequestError as e:
-            # Invalid parameters were supplied to Stripe's API
-            messages.error(self.request, 'Invalid parameters')
-
-        except stripe.error.AuthenticationError as e:
-            # Authentication with Stripe's API failed
-            # (maybe you changed API keys recently)
-            messages.error(self.request, 'Not authenticated')
-
-        except stripe.error.APIConnectionError as e:
-            # Network communication with Stripe failed
-            messages.error(self.request, 'Network error')
-
-        except stripe.error.StripeError as e:
-            # Display a very generic error to the user, and maybe send
-            # yourself an email
-            messages.error(
-                self.request, 'Something went wrong. You were not charged. Please try again')
-
-        except Exception as e:
-            # Something else happened, completely unrelated to Stripe
-            messages.error(
-                self.request, 'Something went wrong. You were not charged. We are working on this')
-
-        finally:
+class PaymentStatusView(LoginRequiredMixin, View):
+    def get(self, *args, **kwargs):
+        payment = get_object_or_404(
+            Payment, pk=self.kwargs['pk'], user=self.request.user)
+
+        if self.request.GET.get('format') == 'json':
+            return JsonResponse({
+                'status': payment.get_status_display(),
+                'done': payment.status in (payments.SUCCEEDED, payments.FAILED),
+            })
+
+        if payment.status == payments.SUCCEEDED:
+            messages.success(self.request, 'Your order was successful')
             return redirect('home-page')
+        if payment.status == payments.FAILED:
+            messages.error(self.request, payment.error_message)
+            return redirect('payment-page', payment_option='stripe')
+        return render(self.request, 'store/payment-status.html',
+                      {'payment': payment})
 
 
 def add_order_item(request, slug):
     item = get_object_or_404(Item, slug=slug)
-    order_item, created = OrderItem.objects.get_or_create(
-        user=request.user,
-        item=item,
-        ordered=False)
-    order, created = Order.objects.get_or_create(
-        user=request.user,
-        ordered=False,
-        defaults={'ordered_date': timezone.now()})
-    if order.items.filter(item=item).exists():
-        order_item.quantity += 1
+    if request.user.is_authenticated:
+        result = cart.add_item(request.user, item)
+    else:
+        result = request.guest_cart.add(item)
+
+    if result == cart.UPDATED:
         messages.info(request,
                       'Item updated')
+    elif result == cart.CART_FULL:
+        messages.warning(
+            request, 'Your cart is full. Log in to add more items')
+    elif result == cart.PAYMENT_PENDING:
+        messages.warning(
+            request, 'Your cart can not change while your payment is processing')
     else:
-        order_item.quantity = 1
-        order.items.add(order_item)
         messages.info(
             request, 'This item has been added to your cart')
-    order_item.save()
 
 
-@login_required
 def add_to_cart(request, slug):
     add_order_item(request, slug)
     return redirect('product-page', slug=slug)
@@ -345,34 +358,32 @@ def add_single_item_to_cart(request, slug):
     return redirect('order-summary-page')
 
 
-def remove_order_item(request, slug):
+def remove_order_item(request, slug, decrement=False):
     item = get_object_or_404(Item, slug=slug)
-    order_qs = Order.objects.filter(user=request.user, ordered=False)
-    if order_qs.exists():
-        order = order_qs[0]
-        if order.items.filter(item=item).exists():
-            order_item = OrderItem.objects.filter(
-                user=request.user,
-                item=item,
-                ordered=False
-            )[0]
-            if 'item' in request.get_full_path() and order_item.quantity > 1:
-                order_item.quantity -= 1
-                order_item.save()
-                messages.info(request, 'Item updated')
-            else:
-                order.items.remove(order_item)
-                messages.info(
-                    request, 'Item has been removed from your cart')
-        else:
-            messages.info(
-                request, 'This item was not in your cart')
+    if not request.user.is_authenticated:
+        guest_cart = request.guest_cart
+        result = guest_cart.decrement(item) if decrement else guest_cart.remove(item)
+    elif decrement:
+        result = cart.decrement_item(request.user, item)
+    else:
+        result = cart.remove_item(request.user, item)
+
+    if result == cart.UPDATED:
+        messages.info(request, 'Item updated')
+    elif result == cart.REMOVED:
+        messages.info(
+            request, 'Item has been removed from your cart')
+    elif result == cart.NOT_IN_CART:
+        messages.info(
+            request, 'This item was not in your cart')
+    elif result == cart.PAYMENT_PENDING:
+        messages.warning(
+            request, 'Your cart can not change while your payment is processing')
     else:
         messages.info(
             request, 'You do not have an active order')
 
 
-@login_required
 def remove_from_cart(request, slug):
     remove_order_item(request, slug)
     return redirect('product-page', slug=slug)
@@ -380,7 +391,7 @@ def remove_from_cart(request, slug):
 
 @login_required
 def remove_single_item_from_cart(request, slug):
-    remove_order_item(request, slug)
+    remove_order_item(request, slug, decrement=True)
     return redirect('order-summary-page')
 
 
@@ -402,14 +413,18 @@ class AddCouponView(View):
     def post(self, *args, **kwargs):
         form = CouponForm(self.request.POST or None)
         if form.is_valid():
-            try:
-                code = form.cleaned_data.get('code')
-                order = Order.objects.get(
-                    user=self.request.user, ordered=False)
-                order.coupon = Coupon.objects.get(code=code)
-                order.save()
+            code = form.cleaned_data.get('code')
+            coupon = Coupon.objects.filter(code=code).first()
+            result = coupon and cart.apply_coupon(self.request.user, coupon)
+            if result == cart.UPDATED:
                 messages.success(self.request, 'Successfully applied Coupon')
-            except ObjectDoesNotExist:
+            elif result == cart.PAYMENT_PENDING:
+                messages.warning(
+                    self.request,
+                    'Your cart can not change while your payment is processing')
+            elif coupon is None:
+                messages.warning(self.request, 'Invalid coupon code')
+            else:
                 messages.warning(
                     self.request, 'You do not have an active order')
             return redirect('checkout-page')
@@ -429,20 +444,31 @@ class RequestRefundView(View):
             ref_code = form.cleaned_data.get('ref_code')
             message = form.cleaned_data.get('message')
             email = form.cleaned_data.get('email')
-            try:
-                order = Order.objects.get(ref_code=ref_code)
-                order.refund_requested = True
-                order.save()
-
-                refund = Refund()
-                refund.order = order
-                refund.reason = message
-                refund.email = email
-                refund.save()
+            order_id = payments.find_order_by_ref_code(ref_code)
+            if order_id is None:
+                messages.info(self.request, 'This order does not exist')
+            else:
+                with transaction.atomic():
+                    Order.objects.filter(pk=order_id).update(
+                        refund_requested=True)
+                    Refund.objects.create(
+                        order_id=order_id, reason=message, email=email)
 
                 messages.info(
                     self.request, 'Your request was received and is being processed')
-            except ObjectDoesNotExist:
-                messages.info(self.request, 'This order does not exist')
 
             return redirect('request-refund')
+
+
+@staff_member_required
+def export_orders(request):
+    """Paid orders as CSV, optionally limited to ?since= and ?until= dates."""
+    orders = Order.objects.filter(ordered=True)
+    for param, lookup in (('since', 'gte'), ('until', 'lte')):
+        try:
+            day = parse_date(request.GET.get(param, ''))
+        except ValueError:
+            day = None
+        if day:
+            orders = orders.filter(**{f'ordered_date__date__{lookup}': day})
+    return orders_csv_response(orders)